@@ -0,0 +1,34 @@
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from records.models import CollectionVersion
+
+
+def records_validators(*parts):
+    """
+    Return (etag, last_modified timestamp) for the records collection.
+    Extra parts (e.g. a user id) are added to the ETag for responses that
+    differ per user at the same URL.
+    """
+    version, modified = CollectionVersion.current(CollectionVersion.RECORDS)
+    etag = '"%s"' % "-".join(["records", str(version), *(str(p) for p in parts)])
+    return etag, int(timegm(modified.utctimetuple()))
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Return a 304 response if the client's If-None-Match / If-Modified-Since
+    headers show it already has this version, otherwise None.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
@@ -0,0 +1,77 @@
+import django_filters
+from rest_framework.filters import OrderingFilter
+from rest_framework_gis.filters import InBBoxFilter
+
+from records.models import Record
+from records.search import search_query, search_rank
+
+
+class RecordBBoxFilter(InBBoxFilter):
+    """
+    Filter records to a map view with ?bbox=minx,miny,maxx,maxy (lng/lat).
+    Uses the && (bounding box overlaps) operator so PostGIS can answer it
+    from the GiST index on Record.geometry.
+    """
+    bbox_param = "bbox"
+
+
+class RecordFilter(django_filters.FilterSet):
+    """
+    Query string filters for the record list, e.g.
+    ?period=iron_age&site_type=enclosure&date_recorded_after=2025-01-01
+    The choice filters accept repeated values (?period=roman&period=medieval).
+    ?q= is a full-text search over title, description, PRN and the type/period labels.
+    """
+    q = django_filters.CharFilter(method="search")
+    site_type = django_filters.MultipleChoiceFilter(choices=Record.SITE_TYPE_CHOICES)
+    monument_type = django_filters.MultipleChoiceFilter(choices=Record.MONUMENT_TYPE_CHOICES)
+    period = django_filters.MultipleChoiceFilter(choices=Record.PERIOD_CHOICES)
+    # Gives ?date_recorded_after= and ?date_recorded_before= (YYYY-MM-DD)
+    date_recorded = django_filters.DateFromToRangeFilter()
+    recorded_by = django_filters.NumberFilter(field_name="recorded_by_id")
+    recorded_by_username = django_filters.CharFilter(field_name="recorded_by__username")
+    # Size filters use the stored measurements (square metres / metres)
+    min_area = django_filters.NumberFilter(field_name="area_m2", lookup_expr="gte")
+    max_area = django_filters.NumberFilter(field_name="area_m2", lookup_expr="lte")
+    min_perimeter = django_filters.NumberFilter(field_name="perimeter_m", lookup_expr="gte")
+    max_perimeter = django_filters.NumberFilter(field_name="perimeter_m", lookup_expr="lte")
+
+    class Meta:
+        model = Record
+        fields = [
+            "site_type",
+            "monument_type",
+            "period",
+            "date_recorded",
+            "recorded_by",
+            "recorded_by_username",
+            "min_area",
+            "max_area",
+            "min_perimeter",
+            "max_perimeter",
+        ]
+
+    def search(self, queryset, name, value):
+        # Matched against the stored search vector, so the GIN index does the work
+        return queryset.filter(search_vector=search_query(value))
+
+
+class RecordOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that puts the best search matches first when ?q= is
+    given and no ?ordering= is asked for.
+    """
+
+    def _search_text(self, request):
+        return request.query_params.get("q", "").strip()
+
+    def get_default_ordering(self, view):
+        if self._search_text(view.request):
+            return ["-search_rank", "-id"]
+        return super().get_default_ordering(view)
+
+    def filter_queryset(self, request, queryset, view):
+        text = self._search_text(request)
+        if text:
+            queryset = queryset.annotate(search_rank=search_rank(text))
+        return super().filter_queryset(request, queryset, view)
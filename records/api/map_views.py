@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.contrib.gis.db.models.functions import SnapToGrid
+from django.db.models import Count
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from records.bundles import BUNDLE_FILENAME, BundleError, check_bundle_size, region_key, round_bbox
+from records.jobs import request_bundle
+from records.models import Record, RegionBundle
+from records.tiles import MAX_TILE_ZOOM, build_tile
+from .caching import add_validators, not_modified, records_validators
+from .filters import RecordBBoxFilter, RecordFilter
+from .renderers import BUNDLE_RENDERER_CLASSES, TILE_RENDERER_CLASSES
+
+CLUSTER_CELL_PIXELS = 80  # roughly how far apart (on screen) cluster markers end up
+
+
+@api_view(["GET"])
+@renderer_classes(TILE_RENDERER_CLASSES)
+def record_tile(request, z, x, y):
+    """
+    Return a Mapbox Vector Tile (layer "records") for tile z/x/y.
+    Each feature carries id, site_type and period.
+    """
+    if z > MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404("Tile out of range")
+
+    # Tiles only change when records do, so the collection version is the ETag.
+    # A revalidation for an unchanged collection never builds the tile.
+    etag, last_modified = records_validators("tile")
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = HttpResponse(build_tile(z, x, y), content_type="application/vnd.mapbox-vector-tile")
+        add_validators(response, etag, last_modified)
+    # Let the browser/CDN keep tiles for a while and then revalidate
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, "RECORDS_TILE_MAX_AGE", 300),
+    )
+    return response
+
+
+@api_view(["GET"])
+def record_clusters(request):
+    """
+    Return record counts per grid cell for ?bbox=minx,miny,maxx,maxy&zoom=N.
+    The grid gets finer as zoom increases. Each cluster has the snapped
+    centroid, a count and a breakdown by period and site_type. Also accepts
+    the same filters as the record list (period, site_type, ...).
+    """
+    try:
+        zoom = int(request.query_params.get("zoom", ""))
+    except ValueError:
+        raise ValidationError({"zoom": "zoom must be a whole number."})
+    if not 0 <= zoom <= MAX_TILE_ZOOM:
+        raise ValidationError({"zoom": f"zoom must be between 0 and {MAX_TILE_ZOOM}."})
+
+    # Size of one grid cell in degrees at this zoom (256px web mercator tiles)
+    cell_size = CLUSTER_CELL_PIXELS * 360 / (256 * 2 ** zoom)
+
+    qs = Record.objects.filter(centroid__isnull=False)
+    bbox = RecordBBoxFilter().get_filter_bbox(request)
+    if bbox is not None:
+        qs = qs.filter(geometry__bboverlaps=bbox)
+    filterset = RecordFilter(request.query_params, queryset=qs, request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+
+    # One GROUP BY query: (cell, period, site_type) -> count.
+    # Snaps the stored centroid (see Record.update_geometry), so no polygon is walked per request.
+    rows = (
+        filterset.qs
+        .annotate(cell=SnapToGrid("centroid", cell_size))
+        .values("cell", "period", "site_type")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+    clusters = {}
+    for row in rows:
+        cell = row["cell"]
+        key = (cell.x, cell.y)
+        cluster = clusters.get(key)
+        if cluster is None:
+            cluster = clusters[key] = {
+                "lat": cell.y,
+                "lng": cell.x,
+                "count": 0,
+                "period": {},
+                "site_type": {},
+            }
+        cluster["count"] += row["count"]
+        cluster["period"][row["period"]] = cluster["period"].get(row["period"], 0) + row["count"]
+        cluster["site_type"][row["site_type"]] = cluster["site_type"].get(row["site_type"], 0) + row["count"]
+
+    return Response({
+        "zoom": zoom,
+        "cell_size": cell_size,
+        "clusters": list(clusters.values()),
+    })
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes(BUNDLE_RENDERER_CLASSES)
+def record_bundle(request):
+    """
+    Download an offline bundle for ?bbox=minx,miny,maxx,maxy: one MBTiles
+    (SQLite) file with the record vector tiles from min_zoom to max_zoom
+    and a "records" table of the records in the area (attributes plus
+    GeoJSON geometry). Bundles are built in the background and cached per
+    area and collection version: until one is ready the response is 202
+    with its status and a Retry-After header, so poll the same URL.
+    """
+    params = request.query_params
+    try:
+        bbox = [float(n) for n in params.get("bbox", "").split(",")]
+    except ValueError:
+        bbox = []
+    if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        raise ValidationError({"bbox": "bbox must be minx,miny,maxx,maxy."})
+    try:
+        min_zoom = int(params.get("min_zoom", 8))
+        max_zoom = int(params.get("max_zoom", 16))
+    except ValueError:
+        raise ValidationError({"detail": "min_zoom and max_zoom must be whole numbers."})
+    if not 0 <= min_zoom <= max_zoom <= MAX_TILE_ZOOM:
+        raise ValidationError({"detail": f"Zooms must satisfy 0 <= min_zoom <= max_zoom <= {MAX_TILE_ZOOM}."})
+
+    bbox = round_bbox(bbox)
+    try:
+        check_bundle_size(bbox, min_zoom, max_zoom)
+    except BundleError as exc:
+        raise ValidationError({"detail": str(exc)})
+
+    # Checked before anything is built: a client holding the current bundle gets a 304
+    etag, last_modified = records_validators("bundle", region_key(bbox, min_zoom, max_zoom))
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    bundle = request_bundle(bbox, min_zoom, max_zoom, request.user)
+    # Plain JSON responses: a DRF Response would be labelled as the MBTiles type asked for
+    if bundle.status == RegionBundle.STATUS_FAILED:
+        return JsonResponse({"status": bundle.status, "error": bundle.error}, status=503)
+    if bundle.status != RegionBundle.STATUS_DONE:
+        response = JsonResponse({"status": bundle.status}, status=202)
+        response["Retry-After"] = "5"
+        return response
+
+    response = FileResponse(
+        bundle.file.open("rb"),
+        as_attachment=True,
+        filename=BUNDLE_FILENAME,
+        content_type="application/vnd.mapbox-vector-tile+sqlite3",
+    )
+    add_validators(response, etag, last_modified)
+    return response
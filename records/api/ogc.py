@@ -0,0 +1,283 @@
+"""
+OGC API - Features (Part 1: Core) over the Record model, so QGIS and other
+GIS clients can connect to the portal directly and load just the features
+in view, a page at a time.
+"""
+from datetime import date
+
+from django.contrib.gis.db.models import Extent
+from django.contrib.gis.geos import Polygon
+from django.db.models import Max, Min
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONOpenAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+
+from records.exports import FEATURE_FIELDS, media_url_prefix, record_feature
+from records.models import Record
+
+COLLECTION_ID = "records"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+OPENAPI_MEDIA_TYPE = "application/vnd.oai.openapi+json;version=3.0"
+
+CONFORMANCE_CLASSES = [
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/core",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/geojson",
+]
+
+
+class GeoJSONRenderer(JSONRenderer):
+    media_type = "application/geo+json"
+    format = "geojson"
+
+
+def _url(request, name, *args, query=None):
+    url = request.build_absolute_uri(reverse(name, args=args))
+    if query:
+        url = f"{url}?{query.urlencode()}"
+    return url
+
+
+def _parse_bbox(value):
+    """bbox=minx,miny,maxx,maxy (a 6 number 3D bbox is accepted, heights ignored)."""
+    try:
+        numbers = [float(n) for n in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) == 6:
+        numbers = [numbers[0], numbers[1], numbers[3], numbers[4]]
+    if len(numbers) != 4:
+        raise ValidationError({"bbox": "bbox must be minx,miny,maxx,maxy."})
+    return numbers
+
+
+def _parse_datetime(value):
+    """
+    datetime is a single date or an interval (start/end, with .. for open ends),
+    matched against date_recorded. Times are ignored.
+    """
+    def to_date(part):
+        if part in ("", ".."):
+            return None
+        try:
+            return date.fromisoformat(part[:10])
+        except ValueError:
+            raise ValidationError({"datetime": f"Invalid date '{part}'."})
+
+    if "/" in value:
+        start, end = value.split("/", 1)
+        return to_date(start), to_date(end)
+    day = to_date(value)
+    return day, day
+
+
+def _collection(request):
+    extent = Record.objects.aggregate(
+        bbox=Extent("geometry"),
+        first=Min("date_recorded"),
+        last=Max("date_recorded"),
+    )
+    return {
+        "id": COLLECTION_ID,
+        "title": "Records",
+        "description": "Archaeological features recorded from LiDAR on the Welsh LiDAR portal.",
+        "itemType": "feature",
+        "crs": ["http://www.opengis.net/def/crs/OGC/1.3/CRS84"],
+        "extent": {
+            "spatial": {"bbox": [list(extent["bbox"])] if extent["bbox"] else []},
+            "temporal": {
+                "interval": [[
+                    extent["first"].isoformat() if extent["first"] else None,
+                    extent["last"].isoformat() if extent["last"] else None,
+                ]],
+            },
+        },
+        "links": [
+            {
+                "href": _url(request, "ogc-collection"),
+                "rel": "self",
+                "type": "application/json",
+                "title": "This collection",
+            },
+            {
+                "href": _url(request, "ogc-items"),
+                "rel": "items",
+                "type": "application/geo+json",
+                "title": "Records as GeoJSON",
+            },
+        ],
+    }
+
+
+@api_view(["GET"])
+def landing_page(request):
+    """OGC API landing page."""
+    return Response({
+        "title": "Welsh LiDAR Portal",
+        "description": "Archaeological records as OGC API - Features.",
+        "links": [
+            {"href": _url(request, "ogc-landing"), "rel": "self", "type": "application/json", "title": "This document"},
+            {"href": _url(request, "ogc-api"), "rel": "service-desc", "type": OPENAPI_MEDIA_TYPE, "title": "API definition (OpenAPI 3.0)"},
+            {"href": _url(request, "ogc-conformance"), "rel": "conformance", "type": "application/json", "title": "Conformance classes"},
+            {"href": _url(request, "ogc-collections"), "rel": "data", "type": "application/json", "title": "Collections"},
+        ],
+    })
+
+
+def _parameter(name, description, schema, location="query", **extra):
+    return {
+        "name": name,
+        "in": location,
+        "required": location == "path",
+        "description": description,
+        "schema": schema,
+        **extra,
+    }
+
+
+def _operation(summary, media_type, parameters=()):
+    return {
+        "get": {
+            "summary": summary,
+            "parameters": list(parameters),
+            "responses": {"200": {"description": summary, "content": {media_type: {}}}},
+        }
+    }
+
+
+def _openapi(request):
+    """A minimal OpenAPI 3.0 description of the endpoints in this module."""
+    return {
+        "openapi": "3.0.3",
+        "info": {"title": "Welsh LiDAR Portal - OGC API Features", "version": "1.0.0"},
+        "servers": [{"url": _url(request, "ogc-landing").rstrip("/")}],
+        "paths": {
+            "/": _operation("Landing page", "application/json"),
+            "/api": _operation("This API definition", "application/vnd.oai.openapi+json"),
+            "/conformance": _operation("Conformance classes", "application/json"),
+            "/collections": _operation("Collections", "application/json"),
+            f"/collections/{COLLECTION_ID}": _operation("The records collection", "application/json"),
+            f"/collections/{COLLECTION_ID}/items": _operation("Records", "application/geo+json", [
+                _parameter("limit", "Records per page.",
+                           {"type": "integer", "minimum": 1, "maximum": MAX_LIMIT, "default": DEFAULT_LIMIT}),
+                _parameter("offset", "Records to skip.", {"type": "integer", "minimum": 0, "default": 0}),
+                _parameter("bbox", "minx,miny,maxx,maxy in lng/lat.",
+                           {"type": "array", "minItems": 4, "maxItems": 6, "items": {"type": "number"}},
+                           style="form", explode=False),
+                _parameter("datetime", "Date or interval (start/end, .. for open) matched against date_recorded.",
+                           {"type": "string"}),
+            ]),
+            f"/collections/{COLLECTION_ID}/items/{{featureId}}": _operation("A record", "application/geo+json", [
+                _parameter("featureId", "Record id.", {"type": "integer"}, location="path"),
+            ]),
+        },
+    }
+
+
+@api_view(["GET"])
+@renderer_classes([JSONOpenAPIRenderer, JSONRenderer])
+def api_definition(request):
+    """OpenAPI definition linked from the landing page (rel service-desc)."""
+    return Response(_openapi(request))
+
+
+@api_view(["GET"])
+def conformance(request):
+    """Conformance classes this API implements."""
+    return Response({"conformsTo": CONFORMANCE_CLASSES})
+
+
+@api_view(["GET"])
+def collections(request):
+    """The one collection: records."""
+    return Response({
+        "links": [
+            {"href": _url(request, "ogc-collections"), "rel": "self", "type": "application/json", "title": "Collections"},
+        ],
+        "collections": [_collection(request)],
+    })
+
+
+@api_view(["GET"])
+def collection(request):
+    """Metadata for the records collection, including its extent."""
+    return Response(_collection(request))
+
+
+@api_view(["GET"])
+@renderer_classes([GeoJSONRenderer, JSONRenderer])
+def items(request):
+    """
+    Records as a GeoJSON FeatureCollection.
+    Supports limit/offset paging (with next/prev links), bbox and datetime
+    (matched against date_recorded).
+    """
+    params = request.query_params
+    try:
+        limit = min(int(params.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+        offset = int(params.get("offset", 0))
+    except ValueError:
+        raise ValidationError({"detail": "limit and offset must be whole numbers."})
+    if limit < 1 or offset < 0:
+        raise ValidationError({"detail": "limit must be at least 1 and offset can't be negative."})
+
+    qs = Record.objects.only(*FEATURE_FIELDS).order_by("id")
+    if params.get("bbox"):
+        bbox = Polygon.from_bbox(_parse_bbox(params["bbox"]))
+        bbox.srid = 4326
+        qs = qs.filter(geometry__bboverlaps=bbox)
+    if params.get("datetime"):
+        start, end = _parse_datetime(params["datetime"])
+        if start:
+            qs = qs.filter(date_recorded__gte=start)
+        if end:
+            qs = qs.filter(date_recorded__lte=end)
+
+    matched = qs.count()
+    media_prefix = media_url_prefix(request)
+    features = []
+    for r in qs[offset:offset + limit]:
+        feature = record_feature(r, media_prefix)
+        feature["id"] = r.id
+        features.append(feature)
+
+    links = [
+        {"href": _url(request, "ogc-items", query=params), "rel": "self", "type": "application/geo+json"},
+        {"href": _url(request, "ogc-collection"), "rel": "collection", "type": "application/json"},
+    ]
+    if offset + limit < matched:
+        query = params.copy()
+        query["offset"] = str(offset + limit)
+        query["limit"] = str(limit)
+        links.append({"href": _url(request, "ogc-items", query=query), "rel": "next", "type": "application/geo+json"})
+    if offset > 0:
+        query = params.copy()
+        query["offset"] = str(max(offset - limit, 0))
+        query["limit"] = str(limit)
+        links.append({"href": _url(request, "ogc-items", query=query), "rel": "prev", "type": "application/geo+json"})
+
+    return Response({
+        "type": "FeatureCollection",
+        "features": features,
+        "numberMatched": matched,
+        "numberReturned": len(features),
+        "links": links,
+    })
+
+
+@api_view(["GET"])
+@renderer_classes([GeoJSONRenderer, JSONRenderer])
+def item(request, pk):
+    """A single record as a GeoJSON Feature."""
+    r = get_object_or_404(Record.objects.only(*FEATURE_FIELDS), pk=pk)
+    feature = record_feature(r, media_url_prefix(request))
+    feature["id"] = r.id
+    feature["links"] = [
+        {"href": _url(request, "ogc-item", r.id), "rel": "self", "type": "application/geo+json"},
+        {"href": _url(request, "ogc-collection"), "rel": "collection", "type": "application/json"},
+    ]
+    return Response(feature)
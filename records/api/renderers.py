@@ -0,0 +1,79 @@
+"""
+MessagePack for the records API, picked with Accept: application/msgpack
+(or ?format=msgpack). The data is the same as the JSON responses; numbers
+such as polygon coordinates are sent as binary floats instead of text.
+"""
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+# Dates, decimals, lazy strings etc. are converted exactly as in JSON responses
+_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
+
+
+class PassThroughRenderer(BaseRenderer):
+    """
+    For views that build their own binary body (vector tiles, MBTiles
+    bundles) and return it as a plain HttpResponse. Listing the media type
+    lets content negotiation accept clients that ask for it, instead of
+    answering 406 before the view runs. Error details are sent as JSON.
+    """
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data)
+
+
+class VectorTileRenderer(PassThroughRenderer):
+    media_type = "application/vnd.mapbox-vector-tile"
+    format = "mvt"
+
+
+class ProtobufTileRenderer(PassThroughRenderer):
+    # What many tile clients (e.g. older Mapbox/MapLibre setups) send
+    media_type = "application/x-protobuf"
+    format = "pbf"
+
+
+class MBTilesRenderer(PassThroughRenderer):
+    media_type = "application/vnd.mapbox-vector-tile+sqlite3"
+    format = "mbtiles"
+
+
+# Renderers/parsers for views that offer MessagePack next to the usual formats
+RECORD_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, MessagePackRenderer]
+RECORD_PARSER_CLASSES = [*api_settings.DEFAULT_PARSER_CLASSES, MessagePackParser]
+
+# Binary map downloads, next to JSON for error details
+TILE_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, VectorTileRenderer, ProtobufTileRenderer]
+BUNDLE_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, MBTilesRenderer]
@@ -1,8 +1,190 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.urls import reverse
 from rest_framework import serializers
-from records.models import Record
+from rest_framework.fields import SkipField, empty
+from rest_framework.settings import api_settings
+from records.models import ExportJob, Record
+from django.conf import settings
+from records.geometry import Reprojector, encode_coordinates, polygon_to_coordinates, quantize_coordinates
 import json
 
 
+def _fast_converter(field):
+    """
+    Return a plain function doing the same as field.to_representation for
+    the simple field types used on records, or None if there isn't one.
+    """
+    field_type = type(field)
+    if field_type is serializers.CharField:
+        return str
+    if field_type is serializers.IntegerField:
+        return int
+    if field_type is serializers.FloatField:
+        return float
+    if field_type is serializers.JSONField and not field.binary:
+        return lambda value: value
+    if field_type is serializers.ChoiceField:
+        choices = field.choice_strings_to_values
+        return lambda value: value if value == '' else choices.get(str(value), value)
+    if field_type is serializers.DateField:
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format is None or output_format.lower() == api_settings.ISO_8601:
+            return None
+        return lambda value: value.strftime(output_format) if value else None
+    return None
+
+
+def _attribute_getter(model, source_attrs):
+    """
+    Return a function that follows source_attrs on an instance (like DRF's
+    get_attribute), or None if the chain can't be worked out from the model.
+    """
+    steps = []
+    for attr in source_attrs:
+        if model is None:
+            return None
+        class_attr = getattr(model, attr, None)
+        if class_attr is None:
+            return None
+        try:
+            model_field = model._meta.get_field(attr)
+        except Exception:
+            model_field = None
+        steps.append((attr, model_field is None and callable(class_attr)))
+        model = model_field.related_model if model_field is not None and model_field.is_relation else None
+
+    def get(instance):
+        for attr, call in steps:
+            try:
+                instance = getattr(instance, attr)
+            except ObjectDoesNotExist:
+                return None
+            if call:
+                instance = instance()
+        return instance
+
+    return get
+
+
+def _lng_lat(pt):
+    """(lng, lat) from a stored [lat, lng] pair or {lat, lng} dict, or None."""
+    try:
+        if isinstance(pt, dict):
+            return float(pt["lng"]), float(pt["lat"])
+        return float(pt[1]), float(pt[0])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def reproject_representations(rows, reprojector):
+    """
+    Reproject the coordinates in serialized records in place.
+    Output pairs are [x, y] in the target system (e.g. [easting, northing]
+    for EPSG:27700) and bbox is [min_x, min_y, max_x, max_y].
+    All coordinates on the page go through the transformation together.
+    """
+    rings = []
+    for rep in rows:
+        polygon = rep.get("polygonCoordinate")
+        points = [_lng_lat(pt) for pt in polygon] if isinstance(polygon, list) else []
+        rings.append([pt for pt in points if pt is not None])
+
+        centroid = rep.get("centroid")
+        rings.append([(centroid[1], centroid[0])] if centroid else [])
+
+        bbox = rep.get("bbox")
+        if bbox:
+            min_x, min_y, max_x, max_y = bbox
+            rings.append([(min_x, min_y), (min_x, max_y), (max_x, max_y), (max_x, min_y)])
+        else:
+            rings.append([])
+
+    rings = iter(reprojector.transform_rings(rings))
+    for rep in rows:
+        polygon, centroid, corners = next(rings), next(rings), next(rings)
+        if "polygonCoordinate" in rep and isinstance(rep["polygonCoordinate"], list):
+            rep["polygonCoordinate"] = [list(pt) for pt in polygon]
+        if rep.get("centroid"):
+            rep["centroid"] = list(centroid[0])
+        if rep.get("bbox"):
+            xs = [x for x, _y in corners]
+            ys = [y for _x, y in corners]
+            rep["bbox"] = [min(xs), min(ys), max(xs), max(ys)]
+
+
+class RecordListSerializer(serializers.ListSerializer):
+    """
+    Fast read path for lists of records.
+    Works out once per list how to read and convert each field, then builds
+    each row with plain attribute lookups instead of going through every
+    DRF field. The output is the same as RecordSerializer's.
+    """
+
+    def _field_plan(self):
+        plan = []
+        for field in self.child._readable_fields:
+            if isinstance(field, serializers.SerializerMethodField):
+                method = getattr(self.child, field.method_name)
+                plan.append((field.field_name, method, None, None, None))
+                continue
+
+            getter = _attribute_getter(Record, field.source_attrs)
+            convert = _fast_converter(field)
+            if getter is None:
+                # Anything unusual goes through DRF as normal
+                getter, convert = field.get_attribute, field.to_representation
+            elif convert is None:
+                convert = field.to_representation
+
+            # What DRF does when part of the source is missing (e.g. recorded_by is NULL)
+            if field.default is not empty:
+                missing = ("default", field.get_default)
+            elif field.allow_null:
+                missing = ("null", None)
+            elif not field.required:
+                missing = ("skip", None)
+            else:
+                missing = ("raise", field.get_attribute)
+            plan.append((field.field_name, getter, convert, missing, field))
+        return plan
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        plan = self._field_plan()
+        finish = self.child.finish_representation
+        rows = []
+        for instance in iterable:
+            rep = {}
+            for name, getter, convert, missing, field in plan:
+                if convert is None:
+                    # SerializerMethodField
+                    rep[name] = getter(instance)
+                    continue
+                try:
+                    value = getter(instance)
+                except SkipField:
+                    continue
+                except (KeyError, AttributeError):
+                    how, fallback = missing
+                    if how == "skip":
+                        continue
+                    if how == "null":
+                        value = None
+                    elif how == "default":
+                        value = fallback()
+                    else:
+                        fallback(instance)  # raises DRF's descriptive error
+                rep[name] = None if value is None else convert(value)
+            rows.append(finish(instance, rep))
+
+        # ?crs= : reproject the whole page in one batch
+        srid = self.child.context.get("srid")
+        if srid:
+            reproject_representations(rows, Reprojector(srid))
+        return rows
+
+
 class RecordSerializer(serializers.ModelSerializer):
     """
     Serializer for the Record model.
@@ -23,6 +205,57 @@ class RecordSerializer(serializers.ModelSerializer):
     period_display = serializers.CharField(source='get_period_display', read_only=True)
     date_recorded = serializers.DateField(format='%d/%m/%Y', read_only=True)
     polygonCoordinate = serializers.JSONField(required=True, allow_null=False)
+    centroid = serializers.SerializerMethodField()
+    bbox = serializers.SerializerMethodField()
+
+    # Named sets of fields for ?view= (e.g. ?view=map only sends what the map draws)
+    FIELD_PROFILES = {
+        "map": ["id", "title", "period", "site_type", "polygonCoordinate"],
+    }
+
+    def __init__(self, *args, **kwargs):
+        # Optional list of field names to include (sparse fieldsets, ?fields=)
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_columns(cls, field_names):
+        """
+        Return the Record columns needed to output field_names, so the
+        queryset can .only() load those.
+        """
+        serializer_fields = cls().fields
+        concrete = {f.name for f in Record._meta.concrete_fields}
+        columns = {"id"}
+        for name in field_names:
+            source_attrs = serializer_fields[name].source.split(".")
+            source = source_attrs[0]
+            if source == "recorded_by" and len(source_attrs) > 1:
+                # Read from the joined user (select_related), e.g. recorded_by.username
+                columns.add(f"recorded_by__{source_attrs[1]}")
+            if source == "*":
+                # SerializerMethodFields (centroid, bbox) read the column with their own name
+                source = name
+            elif source.startswith("get_") and source.endswith("_display"):
+                source = source[len("get_"):-len("_display")]
+            if source in concrete:
+                columns.add(source)
+        return columns
+
+    def get_centroid(self, obj):
+        """Centre of the polygon as [lat, lng] (same order as polygonCoordinate)."""
+        if obj.centroid is None:
+            return None
+        return [obj.centroid.y, obj.centroid.x]
+
+    def get_bbox(self, obj):
+        """Extent of the polygon as [min_lng, min_lat, max_lng, max_lat] (GeoJSON order)."""
+        if obj.bbox is None:
+            return None
+        return list(obj.bbox.extent)
 
     def to_internal_value(self, data):
         """
@@ -61,11 +294,24 @@ class RecordSerializer(serializers.ModelSerializer):
                 float(pt[0]); float(pt[1])
             except Exception:
                 raise serializers.ValidationError("Each vertex must contain two numbers: [lat, lng].")
+        # Optionally drop precision a hand-drawn polygon doesn't have, so stored rows stay small
+        precision = getattr(settings, "RECORDS_INGEST_COORDINATE_PRECISION", None)
+        if precision is not None:
+            value = quantize_coordinates(value, precision)
         return value
 
     def to_representation(self, instance):
         # Start with the default representation
         rep = super().to_representation(instance)
+        return self.finish_representation(instance, rep)
+
+    def finish_representation(self, instance, rep):
+        """
+        Fix-ups applied after the per-field output.
+        Shared with RecordListSerializer so both give the same result.
+        """
+        if "polygonCoordinate" not in rep:
+            return rep
         # Normalise polygonCoordinate: parse legacy strings into arrays
         val = getattr(instance, "polygonCoordinate", None)
         if isinstance(val, str):
@@ -73,10 +319,51 @@ class RecordSerializer(serializers.ModelSerializer):
                 rep["polygonCoordinate"] = json.loads(val)
             except Exception:
                 rep["polygonCoordinate"] = []
+        # Swap in a simplified polygon when the view asked for one (e.g. ?zoom=8)
+        geometry_field = self.context.get("geometry_field")
+        if geometry_field and geometry_field != "geometry":
+            simplified = getattr(instance, geometry_field, None)
+            if simplified is not None:
+                rep["polygonCoordinate"] = polygon_to_coordinates(simplified)
+        # ?geometry_encoding= : quantized, delta-encoded coordinates
+        encoding = self.context.get("geometry_encoding")
+        if encoding:
+            rep["polygonCoordinate"] = encode_coordinates(rep["polygonCoordinate"], *encoding)
         return rep
 
 
     class Meta:
         model = Record
-        fields = '__all__'
-        read_only_fields = ['recorded_by']
+        list_serializer_class = RecordListSerializer
+        # geometry columns are derived from polygonCoordinate and only used for spatial queries/maps
+        exclude = ['geometry', 'geometry_z8', 'geometry_z12', 'geometry_z15', 'change_version', 'search_vector']
+        read_only_fields = ['recorded_by', 'area_m2', 'perimeter_m', 'vertex_count']
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for background export jobs.
+    download_url is filled in once the file is ready.
+    """
+    download_url = serializers.SerializerMethodField()
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.STATUS_DONE:
+            return None
+        request = self.context.get("request")
+        url = reverse("record-export-job-download", args=[obj.pk])
+        return request.build_absolute_uri(url) if request else url
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id',
+            'scope',
+            'format',
+            'status',
+            'error',
+            'created_at',
+            'finished_at',
+            'download_url',
+        ]
+        read_only_fields = ['status', 'error', 'created_at', 'finished_at']
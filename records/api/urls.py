@@ -1,9 +1,49 @@
 from django.urls import path
-from .views import RecordList, RecordCreate, export_records_csv, export_records_geojson
+from .views import (
+    RecordList,
+    RecordCreate,
+    record_changes,
+    record_suggest,
+    record_nearby,
+    record_area_search,
+    export_records_csv,
+    export_records_geojson,
+    export_records_gpkg,
+    export_records_fgb,
+    export_records_shp,
+    ExportJobCreate,
+    ExportJobDetail,
+    export_job_download,
+)
+from .map_views import record_tile, record_clusters, record_bundle
+from . import ogc
 
 urlpatterns = [
     path("records/", RecordList.as_view(), name="record-list"),
     path("records/create/", RecordCreate.as_view(), name="record-create"),
+    path("records/changes/", record_changes, name="record-changes"),
+    path("records/suggest/", record_suggest, name="record-suggest"),
+    path("records/nearby/", record_nearby, name="record-nearby-point"),
+    path("records/<int:pk>/nearby/", record_nearby, name="record-nearby"),
+    path("records/area/", record_area_search, name="record-area-search"),
     path("records/export/csv/", export_records_csv, name="record-export-csv"),
     path("records/export/geojson/", export_records_geojson, name="record-export-geojson"),
+    path("records/export/gpkg/", export_records_gpkg, name="record-export-gpkg"),
+    path("records/export/fgb/", export_records_fgb, name="record-export-fgb"),
+    path("records/export/shp/", export_records_shp, name="record-export-shp"),
+    path("records/export-jobs/", ExportJobCreate.as_view(), name="record-export-job-create"),
+    path("records/export-jobs/<int:pk>/", ExportJobDetail.as_view(), name="record-export-job-detail"),
+    path("records/export-jobs/<int:pk>/download/", export_job_download, name="record-export-job-download"),
+    path("records/clusters/", record_clusters, name="record-clusters"),
+    path("records/tiles/<int:z>/<int:x>/<int:y>.mvt", record_tile, name="record-tile"),
+    path("records/bundle/", record_bundle, name="record-bundle"),
+
+    # OGC API - Features, for QGIS and other GIS clients
+    path("ogc/", ogc.landing_page, name="ogc-landing"),
+    path("ogc/api", ogc.api_definition, name="ogc-api"),
+    path("ogc/conformance", ogc.conformance, name="ogc-conformance"),
+    path("ogc/collections", ogc.collections, name="ogc-collections"),
+    path("ogc/collections/records", ogc.collection, name="ogc-collection"),
+    path("ogc/collections/records/items", ogc.items, name="ogc-items"),
+    path("ogc/collections/records/items/<int:pk>", ogc.item, name="ogc-item"),
 ]
\ No newline at end of file
@@ -1,172 +1,781 @@
-from .serializers import RecordSerializer
-from records.models import Record
-from rest_framework import generics
-from rest_framework.exceptions import ValidationError
-import csv
 import json
-from django.http import HttpResponse, JsonResponse
-from rest_framework.decorators import api_view, permission_classes
+
+from django_filters.rest_framework import DjangoFilterBackend
+from .filters import RecordBBoxFilter, RecordFilter, RecordOrderingFilter
+from .caching import add_validators, not_modified, records_validators
+from .pagination import RecordCursorPagination
+from .ogc import GeoJSONRenderer
+from .renderers import RECORD_PARSER_CLASSES, RECORD_RENDERER_CLASSES
+from .serializers import ExportJobSerializer, RecordSerializer
+from records.models import CollectionVersion, ExportJob, Record, RecordTombstone
+from records.jobs import find_reusable_job, start_export_job
+from records.spatial import duplicate_candidates, nearest_records, records_near_area
+from records.exports import (
+    FEATURE_FIELDS,
+    EXPORT_FILENAMES,
+    GIS_EXPORT_FORMATS,
+    ExportError,
+    csv_rows,
+    geojson_chunks,
+    media_url_prefix,
+    open_gis_export,
+)
+from records.geometry import (
+    GEOMETRY_ENCODINGS,
+    OUTPUT_SRIDS,
+    WGS84,
+    Reprojector,
+    geometry_field_for_tolerance,
+    geometry_field_for_zoom,
+    polygon_from_coordinates,
+)
+from rest_framework import generics
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Point
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+
+
+def geometry_field_from_request(request):
+    """
+    Work out which geometry column to draw polygons from, using ?zoom=
+    (map zoom level) or ?tolerance= (degrees). Returns None if neither is given.
+    """
+    zoom = request.query_params.get("zoom")
+    tolerance = request.query_params.get("tolerance")
+    try:
+        if zoom not in (None, ""):
+            return geometry_field_for_zoom(int(zoom))
+        if tolerance not in (None, ""):
+            return geometry_field_for_tolerance(float(tolerance))
+    except ValueError:
+        raise ValidationError({"detail": "zoom must be a whole number and tolerance a number."})
+    return None
+
+
+def srid_from_request(request):
+    """
+    Output coordinate system from ?crs=27700 (or EPSG:27700).
+    Returns None for the default WGS84 lng/lat.
+    """
+    crs = request.query_params.get("crs")
+    if not crs:
+        return None
+    try:
+        srid = int(crs.upper().replace("EPSG:", ""))
+    except ValueError:
+        srid = None
+    if srid not in OUTPUT_SRIDS:
+        raise ValidationError({"crs": f"crs must be one of {', '.join(map(str, OUTPUT_SRIDS))}."})
+    return None if srid == WGS84 else srid
+
+
+def geometry_encoding_from_request(request):
+    """
+    Compact polygonCoordinate output from ?geometry_encoding=polyline|delta,
+    quantized to ?precision= decimal places (default
+    RECORDS_COORDINATE_PRECISION). Returns (encoding, precision) or None.
+    """
+    encoding = request.query_params.get("geometry_encoding")
+    if not encoding:
+        return None
+    if encoding not in GEOMETRY_ENCODINGS:
+        raise ValidationError({"geometry_encoding": f"geometry_encoding must be one of {', '.join(GEOMETRY_ENCODINGS)}."})
+    # ?crs=4326 is the default output, so only a reprojection is a conflict
+    if srid_from_request(request) is not None:
+        raise ValidationError({"geometry_encoding": "geometry_encoding can't be combined with crs."})
+    try:
+        precision = int(request.query_params.get("precision", settings.RECORDS_COORDINATE_PRECISION))
+    except ValueError:
+        precision = -1
+    if not 0 <= precision <= 9:
+        raise ValidationError({"precision": "precision must be a whole number of decimal places from 0 to 9."})
+    return encoding, precision
+
+
+def fields_from_request(request):
+    """
+    Return the list of record fields asked for with ?fields=a,b,c or a named
+    profile such as ?view=map, or None to return every field.
+    """
+    view = request.query_params.get("view")
+    fields = request.query_params.get("fields")
+    if view:
+        if view not in RecordSerializer.FIELD_PROFILES:
+            raise ValidationError({"view": f"Unknown view '{view}'."})
+        return RecordSerializer.FIELD_PROFILES[view]
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = set(names) - set(RecordSerializer().fields)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {', '.join(sorted(unknown))}."})
+        return names
+    return None
 
 
 class RecordList(generics.ListAPIView):
     """
     API view to retrieve a list of all records.
+    Pass ?bbox=minx,miny,maxx,maxy (lng/lat) to only get records in the current map view.
+    Can be filtered by site_type, monument_type, period, date_recorded and recorded_by (see RecordFilter).
+    Results are cursor paginated: follow the "next" link to get the following page.
+    Pass ?zoom= or ?tolerance= to get simplified polygons for zoomed out maps.
+    Sort with ?ordering=, e.g. ?ordering=-area_m2 for the largest sites first.
+    Ask for fewer fields with ?fields=id,title,... or ?view=map.
+    Sends ETag/Last-Modified; an unchanged collection gets a 304 Not Modified.
+    Pass ?crs=27700 for British National Grid [easting, northing] coordinates.
+    Send Accept: application/msgpack for MessagePack instead of JSON.
+    Pass ?geometry_encoding=polyline or delta (with ?precision=) for compact coordinates.
+    Search with ?q= (e.g. ?q=hillfort llandeilo); results come best match first.
     """
     queryset = Record.objects.all()
     serializer_class = RecordSerializer
+    renderer_classes = RECORD_RENDERER_CLASSES
+    pagination_class = RecordCursorPagination
+    filter_backends = [RecordBBoxFilter, DjangoFilterBackend, RecordOrderingFilter]
+    filterset_class = RecordFilter
+    ordering_fields = ["id", "date_recorded", "area_m2", "perimeter_m", "vertex_count"]
+    ordering = ["-id"]
+    bbox_filter_field = "geometry"
+    bbox_filter_include_overlapping = True  # include polygons that cross the edge of the view
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        geometry_field = geometry_field_from_request(self.request)
+
+        fields = fields_from_request(self.request)
+        if fields is not None:
+            # Only load the columns behind the requested fields
+            columns = RecordSerializer.model_columns(fields)
+            if "polygonCoordinate" in columns and geometry_field:
+                columns.add(geometry_field)
+            if "recorded_by" in columns:
+                queryset = queryset.select_related("recorded_by")
+            return queryset.only(*columns)
+
+        # Join the user in the same query (recorded_by / recorded_by_user_id)
+        queryset = queryset.select_related("recorded_by")
+
+        # Only load the geometry column we are going to draw from (if any)
+        unused = [
+            f for f in ["geometry"] + Record.SIMPLIFIED_GEOMETRY_FIELDS
+            if f != geometry_field
+        ]
+        return queryset.defer(*unused, "search_vector")
+
+    def get(self, request, *args, **kwargs):
+        # Answer from the collection version before touching the records.
+        # JSON and MessagePack copies of a page get different ETags.
+        etag, last_modified = records_validators(request.accepted_renderer.format)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            add_validators(response, etag, last_modified)
+        # Let clients keep the list but check back each time
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", fields_from_request(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["geometry_field"] = geometry_field_from_request(self.request)
+        context["srid"] = srid_from_request(self.request)
+        context["geometry_encoding"] = geometry_encoding_from_request(self.request)
+        return context
+
+def record_queryset_for_fields(fields):
+    """Record queryset loading just what the serializer needs for fields (None for all)."""
+    queryset = Record.objects.all()
+    if fields is not None:
+        columns = RecordSerializer.model_columns(fields)
+        if "recorded_by" in columns:
+            queryset = queryset.select_related("recorded_by")
+        return queryset.only(*columns)
+    return queryset.select_related("recorded_by").defer(
+        "geometry", *Record.SIMPLIFIED_GEOMETRY_FIELDS, "search_vector"
+    )
+
+
+class RecordOutput:
+    """
+    The record list output options of a request (?fields=/?view=, ?crs=,
+    ?geometry_encoding=) for views that return records outside RecordList.
+    Created first thing in the view, so a bad option is a 400 before any
+    query runs.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.fields = fields_from_request(request)
+        self.srid = srid_from_request(request)
+        self.geometry_encoding = geometry_encoding_from_request(request)
+
+    def queryset(self):
+        """Records loading just what these fields need."""
+        return record_queryset_for_fields(self.fields)
+
+    def data(self, records):
+        """Serialize records in the record list format."""
+        return RecordSerializer(
+            records,
+            many=True,
+            fields=self.fields,
+            context={
+                "request": self.request,
+                "srid": self.srid,
+                "geometry_encoding": self.geometry_encoding,
+            },
+        ).data
+
+
+def parse_sync_token(value):
+    """
+    Parse a changes feed token: "<version>" (everything up to and including
+    that version has been sent) or "<version>:<id>" (part way through a
+    version, up to and including that record id). Returns (version, id or
+    None), or None when there is no token.
+    """
+    if value in (None, ""):
+        return None
+    version, _, last_id = value.partition(":")
+    try:
+        token = (int(version), int(last_id) if last_id else None)
+    except ValueError:
+        token = (-1, None)
+    if token[0] < 0 or (token[1] is not None and token[1] < 0):
+        raise ValidationError({"since": "Invalid sync token."})
+    return token
+
+
+def _after_token(token, id_field):
+    """Q for rows that come after a sync token, ordered by (change_version, id_field)."""
+    version, last_id = token
+    if last_id is None:
+        return Q(change_version__gt=version)
+    return Q(change_version__gt=version) | Q(change_version=version, **{f"{id_field}__gt": last_id})
+
+
+@api_view(["GET"])
+@renderer_classes(RECORD_RENDERER_CLASSES)
+def record_changes(request):
+    """
+    Records created, updated or deleted since ?since=<token>, for clients
+    keeping their own copy of the records in sync.
+    Returns the changed records, the ids of deleted ones and a new token to
+    send next time. Leave since out to get every record (a full sync). When
+    "more" is true there are further changes: call again straight away with
+    the new token.
+    Accepts ?fields=/?view=, ?crs=, ?geometry_encoding= and MessagePack like the record list.
+    """
+    since = parse_sync_token(request.query_params.get("since"))
+    output = RecordOutput(request)
+
+    etag, last_modified = records_validators(
+        "changes", request.query_params.get("since", ""), request.accepted_renderer.format
+    )
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    # Versions are handed out in commit order (see Record.save), so every
+    # change up to the current version is already visible
+    current, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+    limit = settings.RECORDS_MAX_PAGE_SIZE
+
+    changed = output.queryset().filter(change_version__lte=current)
+    if output.fields is not None:
+        changed = changed.only(*RecordSerializer.model_columns(output.fields), "change_version")
+    if since is not None:
+        changed = changed.filter(_after_token(since, "id"))
+    changed = list(changed.order_by("change_version", "id")[:limit + 1])
+
+    # A full sync (no token) has nothing to delete on the client
+    deleted = []
+    if since is not None:
+        deleted = list(
+            RecordTombstone.objects
+            .filter(_after_token(since, "record_id"), change_version__lte=current)
+            .order_by("change_version", "record_id")
+            .values_list("change_version", "record_id")[:limit + 1]
+        )
+
+    # Send at most a page of changes, oldest first, and stop the token there.
+    # Many records can share a version (e.g. after a migration), so a page
+    # that ends part way through one records the last id as well.
+    keys = sorted([(r.change_version, r.id) for r in changed] + deleted)
+    more = len(keys) > limit
+    if more:
+        last = keys[limit - 1]
+        token = "%s:%s" % last
+        changed = [r for r in changed if (r.change_version, r.id) <= last]
+        deleted = [key for key in deleted if key <= last]
+    else:
+        token = str(current)
+
+    response = Response({
+        "token": token,
+        "more": more,
+        "changed": output.data(changed),
+        "deleted": [record_id for _v, record_id in deleted],
+    })
+    add_validators(response, etag, last_modified)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 25
+
+
+@api_view(["GET"])
+def record_suggest(request):
+    """
+    Typeahead suggestions for ?prefix= (at least 2 characters): up to
+    ?limit= records as {id, title, PRN}, matched on PRN or title.
+    Uses the trigram indexes on PRN and title, so it is cheap enough to
+    call on every keystroke.
+    """
+    prefix = request.query_params.get("prefix", "").strip()
+    if len(prefix) < 2:
+        raise ValidationError({"prefix": "prefix must be at least 2 characters."})
+    try:
+        limit = min(int(request.query_params.get("limit", SUGGEST_DEFAULT_LIMIT)), SUGGEST_MAX_LIMIT)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({"limit": "limit must be a positive whole number."})
+
+    etag, last_modified = records_validators("suggest")
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    # A prefix match can use the trigram index from the first two characters;
+    # matching anywhere in the title needs a whole trigram (3 characters)
+    match = Q(PRN__istartswith=prefix) | Q(title__istartswith=prefix)
+    if len(prefix) >= 3:
+        match |= Q(title__icontains=prefix)
+    suggestions = (
+        Record.objects.filter(match)
+        .annotate(score=Greatest(
+            TrigramSimilarity("PRN", prefix),
+            TrigramWordSimilarity(prefix, "title"),
+        ))
+        .order_by("-score", "title")
+        .values("id", "title", "PRN")[:limit]
+    )
+    response = Response(list(suggestions))
+    add_validators(response, etag, last_modified)
+    return response
+
+
+NEARBY_DEFAULT_K = 10
+NEARBY_MAX_K = 100
+
+
+@api_view(["GET"])
+@renderer_classes(RECORD_RENDERER_CLASSES)
+def record_nearby(request, pk=None):
+    """
+    The ?k= records nearest to a record (/records/<id>/nearby/) or to a
+    point (/records/nearby/?near=lng,lat), closest first, measured between
+    centroids. Each record gets distance_m (metres).
+    Accepts ?fields=/?view=, ?crs=, ?geometry_encoding= and MessagePack like the record list.
+    """
+    try:
+        k = min(int(request.query_params.get("k", NEARBY_DEFAULT_K)), NEARBY_MAX_K)
+    except ValueError:
+        k = 0
+    if k < 1:
+        raise ValidationError({"k": "k must be a positive whole number."})
+    output = RecordOutput(request)
+
+    exclude = None
+    if pk is not None:
+        record = get_object_or_404(Record.objects.only("id", "centroid"), pk=pk)
+        if record.centroid is None:
+            raise ValidationError({"detail": "This record has no geometry."})
+        point, exclude = record.centroid, record.pk
+    else:
+        try:
+            lng, lat = [float(n) for n in request.query_params.get("near", "").split(",")]
+        except ValueError:
+            raise ValidationError({"near": "near must be lng,lat."})
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ValidationError({"near": "near must be lng,lat in degrees."})
+        point = Point(lng, lat, srid=4326)
+
+    etag, last_modified = records_validators("nearby", request.accepted_renderer.format)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    queryset = output.queryset()
+    if exclude is not None:
+        queryset = queryset.exclude(pk=exclude)
+    records = list(nearest_records(point, k, queryset))
+
+    results = output.data(records)
+    for rep, record in zip(results, records):
+        rep["distance_m"] = record.distance.m
+    response = Response(results)
+    add_validators(response, etag, last_modified)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+AOI_GEOMETRY_TYPES = ["Polygon", "MultiPolygon", "LineString", "MultiLineString"]
+AOI_MAX_BUFFER = 5000  # metres
+
+
+def area_from_request(request):
+    """
+    The area of interest posted as {"geometry": <GeoJSON>, "buffer": metres}.
+    The geometry can be a GeoJSON geometry or Feature in lng/lat.
+    Returns (GEOS geometry, buffer).
+    """
+    data = request.data
+    geometry = data.get("geometry") if hasattr(data, "get") else None
+    if isinstance(geometry, str):
+        # Form posts send the GeoJSON as a string
+        try:
+            geometry = json.loads(geometry)
+        except ValueError:
+            geometry = None
+    if isinstance(geometry, dict) and geometry.get("type") == "Feature":
+        geometry = geometry.get("geometry")
+    if not isinstance(geometry, dict) or geometry.get("type") not in AOI_GEOMETRY_TYPES:
+        raise ValidationError({"geometry": f"geometry must be a GeoJSON {', '.join(AOI_GEOMETRY_TYPES)}."})
+    try:
+        area = GEOSGeometry(json.dumps(geometry), srid=4326)
+    except (GDALException, GEOSException, ValueError):
+        raise ValidationError({"geometry": "geometry is not valid GeoJSON."})
+    if area.empty:
+        raise ValidationError({"geometry": "geometry is empty."})
+    if not area.valid:
+        area = area.make_valid()
+
+    try:
+        buffer = float(data.get("buffer", 0))
+    except (TypeError, ValueError):
+        buffer = -1
+    if not 0 <= buffer <= AOI_MAX_BUFFER:
+        raise ValidationError({"buffer": f"buffer must be a distance in metres from 0 to {AOI_MAX_BUFFER}."})
+    return area, buffer
+
+
+@api_view(["POST"])
+@renderer_classes([*RECORD_RENDERER_CLASSES, GeoJSONRenderer])
+@parser_classes(RECORD_PARSER_CLASSES)
+def record_area_search(request):
+    """
+    Records within a distance of an area of interest, e.g. "everything within
+    250m of this site boundary". POST {"geometry": <GeoJSON polygon or line>,
+    "buffer": 250}. Distances are measured in British National Grid.
+    Returns {"count", "results", "more", "after"} in the record list format
+    (?fields=/?view=, ?crs=, ?geometry_encoding=, MessagePack), ?page_size=
+    records at a time in id order: while "more" is true, post the same body
+    with "after" set to the returned value for the next page. Or every match
+    as a GeoJSON FeatureCollection with ?format=geojson.
+    """
+    area, buffer = area_from_request(request)
+    output = RecordOutput(request)
+
+    if request.accepted_renderer.format == "geojson":
+        qs = records_near_area(area, buffer, Record.objects.only(*FEATURE_FIELDS)).order_by("id")
+        reprojector = Reprojector(output.srid) if output.srid else None
+        return StreamingHttpResponse(
+            geojson_chunks(qs, media_url_prefix(request), reprojector),
+            content_type=GeoJSONRenderer.media_type,
+        )
+
+    after = request.data.get("after") if hasattr(request.data, "get") else None
+    try:
+        after = int(after) if after not in (None, "") else None
+    except (TypeError, ValueError):
+        after = -1
+    if after is not None and after < 0:
+        raise ValidationError({"after": "after must be a record id from the previous page."})
+    page_size = RecordCursorPagination().get_page_size(request)
+
+    qs = records_near_area(area, buffer, output.queryset()).order_by("id")
+    count = qs.count()
+    if after is not None:
+        qs = qs.filter(id__gt=after)
+    # One extra row tells us whether there is another page
+    page = list(qs[:page_size + 1])
+    more = len(page) > page_size
+    page = page[:page_size]
+    return Response({
+        "count": count,
+        "results": output.data(page),
+        "more": more,
+        "after": page[-1].id if more else None,
+    })
+
+
+class DuplicateRecord(Exception):
+    """
+    Raised by RecordCreate.perform_create when the polygon matches existing
+    records. Not an APIException: DRF would turn every value in the
+    duplicates list into a string.
+    """
+
+    def __init__(self, duplicates):
+        super().__init__("This looks like a record that already exists.")
+        self.duplicates = duplicates
+
+
+def _confirmed(value):
+    return value is True or str(value).lower() in ("true", "1", "yes")
+
 
 class RecordCreate(generics.CreateAPIView):
     """
     API view that allows users to create a new record.
     When a POST request is sent to this view (with the right data), it will use the RecordSerializer to validate and save a new record to the database.
+    Also takes and returns MessagePack (Content-Type / Accept: application/msgpack).
+    If the polygon overlaps an existing record closely (see
+    RECORDS_DUPLICATE_IOU_THRESHOLD) the record is not saved and a 409 lists
+    the possible duplicates. Send confirm_duplicate=true to save it anyway;
+    the matches are then returned as possible_duplicates.
     """
     queryset = Record.objects.all()
     serializer_class = RecordSerializer
-
+    renderer_classes = RECORD_RENDERER_CLASSES
+    parser_classes = RECORD_PARSER_CLASSES
+
+    def create(self, request, *args, **kwargs):
+        self.duplicates = []
+        try:
+            response = super().create(request, *args, **kwargs)
+        except DuplicateRecord as exc:
+            return Response({
+                "detail": "This polygon closely overlaps existing records. "
+                          "Send confirm_duplicate=true to save it anyway.",
+                "duplicates": exc.duplicates,
+            }, status=status.HTTP_409_CONFLICT)
+        if self.duplicates:
+            response.data["possible_duplicates"] = self.duplicates
+        return response
+
+    def find_duplicates(self, polygon_coordinate):
+        """Existing records this polygon may be a copy of, as {id, title, PRN, iou}."""
+        threshold = getattr(settings, "RECORDS_DUPLICATE_IOU_THRESHOLD", 0)
+        geometry = polygon_from_coordinates(polygon_coordinate)
+        if threshold <= 0 or geometry is None:
+            return []
+        return [
+            {"id": r.id, "title": r.title, "PRN": r.PRN, "iou": round(r.iou, 3)}
+            for r in duplicate_candidates(geometry, threshold)
+        ]
 
     def perform_create(self, serializer):
         if Record.objects.count() >= 500:
             raise ValidationError({"detail": "Opps, we are really sorry about this, but it looks like the database is currently full. We can not save your record right now. Please bear with us."})
+
+        self.duplicates = self.find_duplicates(serializer.validated_data.get("polygonCoordinate"))
+        confirmed = _confirmed(self.request.query_params.get("confirm_duplicate")) or _confirmed(
+            self.request.data.get("confirm_duplicate")
+        )
+        if self.duplicates and not confirmed:
+            raise DuplicateRecord(self.duplicates)
         serializer.save(recorded_by=self.request.user)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def export_records_csv(request):
-    """Download the current user's records as a CSV file."""
+    """
+    Download the current user's records as a CSV file.
+    Pass ?crs=27700 for the geometry columns and polygonCoordinate in
+    British National Grid (polygonCoordinate as [easting, northing] pairs).
+    """
+    srid = srid_from_request(request)
 
-    # Only export the signed-in user's records
-    qs = Record.objects.filter(recorded_by=request.user).order_by("-id")
+    # Nothing has changed since the client's copy: skip building the file
+    etag, last_modified = records_validators("csv", request.user.pk)
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
 
-    response = HttpResponse(content_type="text/csv")
+    # Only export the signed-in user's records
+    qs = (
+        Record.objects.filter(recorded_by=request.user)
+        .defer(*Record.SIMPLIFIED_GEOMETRY_FIELDS, "search_vector")
+        .order_by("-id")
+    )
+
+    # Rows are written as they are read, so memory stays flat however many records there are
+    reprojector = Reprojector(srid) if srid else None
+    response = StreamingHttpResponse(csv_rows(qs, reprojector), content_type="text/csv")
     response["Content-Disposition"] = 'attachment; filename="records.csv"'
+    add_validators(response, etag, last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_records_geojson(request):
+    """
+    Download the current user's records as a GeoJSON FeatureCollection.
+    Pass ?crs=27700 for coordinates in British National Grid.
+    """
+    srid = srid_from_request(request)
+
+    etag, last_modified = records_validators("geojson", request.user.pk)
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    qs = (
+        Record.objects.filter(recorded_by=request.user)
+        .only(*FEATURE_FIELDS)
+        .order_by("-id")
+    )
+
+    # Features are encoded and sent one at a time as they are read
+    resp = StreamingHttpResponse(
+        geojson_chunks(qs, media_url_prefix(request), Reprojector(srid) if srid else None),
+        content_type="application/geo+json",
+    )
+    resp["Content-Disposition"] = 'attachment; filename="records.geojson"'
+    add_validators(resp, etag, last_modified)
+    patch_cache_control(resp, private=True, no_cache=True)
+    return resp
+
+
+def _gis_export(request, fmt):
+    """
+    Shared body of the GeoPackage / FlatGeobuf / Shapefile export views.
+    Pass ?crs=27700 to write the file in British National Grid.
+    """
+    srid = srid_from_request(request)
+    etag, last_modified = records_validators(fmt, request.user.pk)
+    cached = not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+
+    qs = (
+        Record.objects.filter(recorded_by=request.user)
+        .only(*FEATURE_FIELDS)
+        .order_by("-id")
+    )
+    try:
+        export = open_gis_export(qs, media_url_prefix(request), fmt, srid)
+    except ExportError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    spec = GIS_EXPORT_FORMATS[fmt]
+    resp = FileResponse(
+        export,
+        as_attachment=True,
+        filename=spec.get("zip", spec["filename"]),
+        content_type=spec["content_type"],
+    )
+    add_validators(resp, etag, last_modified)
+    patch_cache_control(resp, private=True, no_cache=True)
+    return resp
 
-    writer = csv.writer(response)
 
-    # Export all concrete fields on the Record model (auto stays in sync)
-    field_names = [f.name for f in Record._meta.fields]
-    writer.writerow(field_names)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_records_gpkg(request):
+    """Download the current user's records as a GeoPackage (with spatial index)."""
+    return _gis_export(request, "gpkg")
 
-    for r in qs:
-        row = []
-        for name in field_names:
-            field = Record._meta.get_field(name)
 
-            # ForeignKeys: write the raw ID (e.g. recorded_by_id)
-            if field.is_relation and field.many_to_one:
-                value = getattr(r, f"{name}_id", "")
-            else:
-                value = getattr(r, name, "")
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_records_fgb(request):
+    """Download the current user's records as FlatGeobuf (with packed Hilbert R-tree index)."""
+    return _gis_export(request, "fgb")
 
-            # Geometry fields: convert to WKT so it stays usable
-            if hasattr(value, "wkt"):
-                value = value.wkt
 
-            if value is None:
-                value = ""
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export_records_shp(request):
+    """Download the current user's records as a zipped Shapefile."""
+    return _gis_export(request, "shp")
 
-            row.append(value)
 
-        writer.writerow(row)
+def _export_jobs_for(user):
+    """Jobs a user may see: exports of their own records, plus site-wide ones for staff."""
+    if user.is_staff:
+        return ExportJob.objects.filter(Q(owner=user) | Q(scope=ExportJob.SCOPE_ALL))
+    return ExportJob.objects.filter(owner=user, scope=ExportJob.SCOPE_MINE)
 
-    return response
+
+class ExportJobCreate(generics.CreateAPIView):
+    """
+    API view to start a background export.
+    POST {"format": "gpkg", "scope": "mine" | "all"}. "all" exports every
+    record and is staff only. If an up-to-date file (or a job building it)
+    already exists it is returned instead of starting a new one.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        scope = serializer.validated_data.get("scope", ExportJob.SCOPE_MINE)
+        fmt = serializer.validated_data["format"]
+
+        if scope == ExportJob.SCOPE_ALL and not request.user.is_staff:
+            raise PermissionDenied("Only staff can export all records.")
+        owner = request.user if scope == ExportJob.SCOPE_MINE else None
+
+        job = find_reusable_job(scope, fmt, owner)
+        if job is not None:
+            return Response(self.get_serializer(job).data, status=status.HTTP_200_OK)
+
+        job = serializer.save(requested_by=request.user, owner=owner)
+        start_export_job(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetail(generics.RetrieveAPIView):
+    """
+    API view to check on an export job.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return _export_jobs_for(self.request.user)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def export_records_geojson(request):
-    """Download the current user's records as a GeoJSON FeatureCollection."""
-
-    qs = Record.objects.filter(recorded_by=request.user).order_by("-id")
-
-    def _to_ring(coords):
-        """Convert stored coords (likely Leaflet lat/lng) to a GeoJSON ring (lng/lat) and close it."""
-        if not coords:
-            return None
-
-        ring = []
-        for pt in coords:
-            lat = lng = None
-
-            # Accept {lat: .., lng: ..}
-            if isinstance(pt, dict):
-                lat = pt.get("lat")
-                lng = pt.get("lng")
-
-            # Accept [lat, lng] or (lat, lng)
-            elif isinstance(pt, (list, tuple)) and len(pt) >= 2:
-                lat, lng = pt[0], pt[1]
-
-            if lat is None or lng is None:
-                continue
-
-            # GeoJSON expects [lng, lat]
-            ring.append([float(lng), float(lat)])
-
-        if len(ring) < 3:
-            return None
-
-        # Close ring if needed
-        if ring[0] != ring[-1]:
-            ring.append(ring[0])
-
-        return ring
-
-    features = []
-
-    for r in qs:
-        # Try to interpret polygonCoordinate as a list of points.
-        coords = getattr(r, "polygonCoordinate", None)
-
-        # Some DB fields may store JSON as a string; try to parse if needed.
-        if isinstance(coords, str):
-            try:
-                coords = json.loads(coords)
-            except Exception:
-                coords = None
-
-        ring = _to_ring(coords) if coords else None
-
-        geometry = None
-        if ring:
-            geometry = {
-                "type": "Polygon",
-                "coordinates": [ring],
-            }
-
-        props = {
-            "id": r.id,
-            "title": getattr(r, "title", ""),
-            "description": getattr(r, "description", ""),
-            "PRN": getattr(r, "PRN", ""),
-            "site_type": getattr(r, "site_type", ""),
-            "monument_type": getattr(r, "monument_type", ""),
-            "period": getattr(r, "period", ""),
-            "date_recorded": str(getattr(r, "date_recorded", "")) if getattr(r, "date_recorded", None) else "",
-            "recorded_by": getattr(r, "recorded_by_id", ""),
-        }
-
-        # Include image URLs if present (use absolute URLs so QGIS can open them)
-        for i in range(1, 6):
-            field_name = f"picture{i}"
-            f = getattr(r, field_name, None)
-            if f and hasattr(f, "url"):
-                props[field_name] = request.build_absolute_uri(f.url)
-            else:
-                props[field_name] = ""
-
-        features.append({
-            "type": "Feature",
-            "geometry": geometry,
-            "properties": props,
-        })
-
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features,
-    }
-
-    resp = HttpResponse(json.dumps(geojson), content_type="application/geo+json")
-    resp["Content-Disposition"] = 'attachment; filename="records.geojson"'
-    return resp
+def export_job_download(request, pk):
+    """Download the file built by a finished export job."""
+    job = get_object_or_404(_export_jobs_for(request.user), pk=pk)
+    if job.status != ExportJob.STATUS_DONE or not job.file:
+        return Response(
+            {"detail": f"Export is not ready (status: {job.status})."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return FileResponse(
+        job.file.open("rb"),
+        as_attachment=True,
+        filename=EXPORT_FILENAMES[job.format],
+    )
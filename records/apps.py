@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecordsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'records'
+
+    def ready(self):
+        # Import signals so the collection version is bumped on record changes
+        import records.signals
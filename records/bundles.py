@@ -0,0 +1,167 @@
+"""
+Offline region bundles: a single MBTiles (SQLite) file holding the vector
+tiles for an area over a range of zooms, plus the records in that area as a
+plain table, so a field app can work with no connection at all.
+Bundles are built in the background (see records.jobs.request_bundle) and
+reused until the records collection changes.
+"""
+import gzip
+import hashlib
+import json
+import math
+import sqlite3
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+
+from records.exports import EXPORT_CHUNK_SIZE, FEATURE_FIELDS, record_feature
+from records.models import Record
+from records.tiles import TILE_LAYER, build_tile, count_tiles, tiles_in_bbox
+
+BUNDLE_FILENAME = "records-offline.mbtiles"
+
+# Bundle bboxes are rounded out to this many decimal places (about 100m), so
+# nearby requests for "the same" area share a cached file.
+BBOX_PRECISION = 3
+
+RECORD_COLUMNS = [
+    "id", "title", "description", "PRN", "site_type", "monument_type", "period",
+    "date_recorded", "recorded_by",
+]
+
+
+class BundleError(Exception):
+    """Raised when a bundle can't be built for the requested area (e.g. too many tiles)."""
+
+
+def round_bbox(bbox):
+    """Round a bbox outwards to BBOX_PRECISION decimal places."""
+    factor = 10 ** BBOX_PRECISION
+    minx, miny, maxx, maxy = bbox
+    return (
+        math.floor(minx * factor) / factor,
+        math.floor(miny * factor) / factor,
+        math.ceil(maxx * factor) / factor,
+        math.ceil(maxy * factor) / factor,
+    )
+
+
+def region_key(bbox, min_zoom, max_zoom):
+    """Short stable key for a (rounded) bbox and zoom range."""
+    region = json.dumps([list(bbox), min_zoom, max_zoom])
+    return hashlib.sha1(region.encode()).hexdigest()[:16]
+
+
+def _create_tables(db):
+    db.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (
+            zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+        );
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+        CREATE TABLE records (
+            id INTEGER PRIMARY KEY,
+            title TEXT, description TEXT, PRN TEXT, site_type TEXT,
+            monument_type TEXT, period TEXT, date_recorded TEXT, recorded_by INTEGER,
+            geometry TEXT,
+            minx REAL, miny REAL, maxx REAL, maxy REAL
+        );
+        CREATE INDEX records_bbox ON records (minx, maxx, miny, maxy);
+    """)
+
+
+def _write_metadata(db, bbox, min_zoom, max_zoom, version):
+    minx, miny, maxx, maxy = bbox
+    vector_layers = [{
+        "id": TILE_LAYER,
+        "fields": {"id": "Number", "site_type": "String", "period": "String"},
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+    }]
+    metadata = {
+        "name": "Welsh LiDAR Portal records",
+        "format": "pbf",
+        "type": "overlay",
+        "version": str(version),
+        "bounds": f"{minx},{miny},{maxx},{maxy}",
+        "center": f"{(minx + maxx) / 2},{(miny + maxy) / 2},{min_zoom}",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "json": json.dumps({"vector_layers": vector_layers}),
+    }
+    db.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", metadata.items())
+
+
+def _write_tiles(db, bbox, min_zoom, max_zoom):
+    for z in range(min_zoom, max_zoom + 1):
+        rows = []
+        for x, y in tiles_in_bbox(bbox, z):
+            tile = build_tile(z, x, y)
+            if not tile:
+                continue
+            # MBTiles counts rows from the bottom (TMS), tiles are gzipped
+            rows.append((z, x, 2 ** z - 1 - y, gzip.compress(tile)))
+        db.executemany(
+            "INSERT INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+def _write_records(db, bbox):
+    area = Polygon.from_bbox(bbox)
+    area.srid = 4326
+    qs = Record.objects.filter(geometry__bboverlaps=area).only(*FEATURE_FIELDS).order_by("id")
+
+    rows = []
+    for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        feature = record_feature(r, "")
+        props = feature["properties"]
+        geometry = feature["geometry"]
+        if geometry:
+            xs = [x for x, _y in geometry["coordinates"][0]]
+            ys = [y for _x, y in geometry["coordinates"][0]]
+            extent = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            extent = (None, None, None, None)
+        rows.append(
+            tuple(props[c] for c in RECORD_COLUMNS)
+            + (json.dumps(geometry) if geometry else None,)
+            + extent
+        )
+        if len(rows) >= EXPORT_CHUNK_SIZE:
+            _insert_records(db, rows)
+            rows = []
+    if rows:
+        _insert_records(db, rows)
+
+
+def _insert_records(db, rows):
+    columns = RECORD_COLUMNS + ["geometry", "minx", "miny", "maxx", "maxy"]
+    db.executemany(
+        f"INSERT INTO records ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows,
+    )
+
+
+def write_bundle(path, bbox, min_zoom, max_zoom, version):
+    """Write the MBTiles bundle for a region to a local file."""
+    db = sqlite3.connect(path)
+    try:
+        _create_tables(db)
+        _write_metadata(db, bbox, min_zoom, max_zoom, version)
+        _write_tiles(db, bbox, min_zoom, max_zoom)
+        _write_records(db, bbox)
+        db.commit()
+    finally:
+        db.close()
+
+
+def check_bundle_size(bbox, min_zoom, max_zoom):
+    """Raise BundleError if the region needs more than RECORDS_BUNDLE_MAX_TILES tiles."""
+    tiles = count_tiles(bbox, min_zoom, max_zoom)
+    max_tiles = getattr(settings, "RECORDS_BUNDLE_MAX_TILES", 5000)
+    if tiles > max_tiles:
+        raise BundleError(
+            f"That area and zoom range needs {tiles} tiles; the limit is {max_tiles}. "
+            "Choose a smaller area or a lower max_zoom."
+        )
@@ -0,0 +1,337 @@
+"""
+Writers for record exports. Records are read from the queryset in chunks
+and written out as they go, so exports of any size use a small, flat
+amount of memory.
+"""
+import csv
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
+from django.utils.encoding import filepath_to_uri
+
+from records.geometry import coordinates_to_ring
+from records.models import Record
+
+# Number of records fetched from the database at a time when exporting
+EXPORT_CHUNK_SIZE = 2000
+
+PICTURE_FIELDS = ["picture1", "picture2", "picture3", "picture4", "picture5"]
+
+# Columns read for GeoJSON-style exports (everything else is deferred)
+FEATURE_FIELDS = [
+    "id", "title", "description", "PRN", "site_type", "monument_type", "period",
+    "date_recorded", "recorded_by", "polygonCoordinate",
+] + PICTURE_FIELDS
+
+
+# ----- CSV -----
+
+class _Echo:
+    """File-like object for csv.writer that hands each line straight back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_columns():
+    """
+    Work out the CSV columns once per export: (header, attribute, is_geometry).
+    Exports all concrete fields on the Record model (auto stays in sync),
+    apart from the simplified map copies of the geometry and the search vector.
+    """
+    columns = []
+    for field in Record._meta.fields:
+        if field.name in Record.SIMPLIFIED_GEOMETRY_FIELDS or field.name == "search_vector":
+            continue
+        # attname is the raw ID for ForeignKeys (e.g. recorded_by_id)
+        columns.append((field.name, field.attname, isinstance(field, GeometryField)))
+    return columns
+
+
+def csv_rows(qs, reprojector=None):
+    """
+    Yield the CSV export one line at a time, reading records in chunks.
+    With a reprojector, geometry columns and polygonCoordinate are written
+    in its coordinate system (polygonCoordinate as [x, y] pairs, e.g.
+    [easting, northing]), one transform call per chunk of records.
+    """
+    writer = csv.writer(_Echo())
+    columns = csv_columns()
+    yield writer.writerow([header for header, _attname, _is_geometry in columns])
+
+    rows = []
+    cells = []  # (row, column index, value) still to be reprojected
+    for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = []
+        for _header, attname, is_geometry in columns:
+            value = getattr(r, attname)
+            if value is None:
+                value = ""
+            elif reprojector is not None and (is_geometry or attname == "polygonCoordinate"):
+                cells.append((row, len(row), value))
+            elif is_geometry:
+                # Geometry fields: convert to WKT so it stays usable
+                value = value.wkt
+            row.append(value)
+        if reprojector is None:
+            yield writer.writerow(row)
+            continue
+        rows.append(row)
+        if len(rows) >= EXPORT_CHUNK_SIZE:
+            _reproject_cells(cells, reprojector)
+            for row in rows:
+                yield writer.writerow(row)
+            rows, cells = [], []
+
+    if rows:
+        _reproject_cells(cells, reprojector)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+def _reproject_cells(cells, reprojector):
+    """
+    Replace the geometry (as WKT) and polygonCoordinate cells of a chunk of
+    CSV rows with reprojected values, sending every ring through together.
+    """
+    rings = []
+    counts = []
+    for _row, _index, value in cells:
+        if isinstance(value, GEOSGeometry):
+            parts = [[value.coords]] if isinstance(value, Point) else [list(ring) for ring in value.coords]
+        else:
+            # polygonCoordinate: drop the closing point coordinates_to_ring adds
+            ring = coordinates_to_ring(value)
+            parts = [ring[:-1] if ring else None]
+        rings.extend(parts)
+        counts.append(len(parts))
+
+    rings = iter(reprojector.transform_rings(rings))
+    for (row, index, value), count in zip(cells, counts):
+        parts = [next(rings) for _ in range(count)]
+        if isinstance(value, Point):
+            row[index] = Point(*parts[0][0], srid=reprojector.srid).wkt
+        elif isinstance(value, GEOSGeometry):
+            row[index] = Polygon(*parts, srid=reprojector.srid).wkt
+        elif parts[0]:
+            row[index] = [list(pt) for pt in parts[0]]
+        else:
+            # Unusable coordinates: better empty than lat/lng in a row of eastings/northings
+            row[index] = ""
+
+
+# ----- GeoJSON -----
+
+def media_url_prefix(request=None):
+    """
+    Absolute URL that picture file names are appended to, worked out once
+    per export rather than calling build_absolute_uri for every picture.
+    Background exports (no request) use SITE_BASE_URL.
+    """
+    storage = Record._meta.get_field("picture1").storage
+    if request is not None:
+        return request.build_absolute_uri(storage.url(""))
+    return urljoin(settings.SITE_BASE_URL, storage.url(""))
+
+
+def record_properties(r, media_prefix):
+    """Attributes of a record for GeoJSON-style exports."""
+    props = {
+        "id": r.id,
+        "title": r.title,
+        "description": r.description,
+        "PRN": r.PRN,
+        "site_type": r.site_type,
+        "monument_type": r.monument_type,
+        "period": r.period,
+        "date_recorded": str(r.date_recorded) if r.date_recorded else "",
+        "recorded_by": r.recorded_by_id,
+    }
+
+    # Include image URLs if present (use absolute URLs so QGIS can open them)
+    for field_name in PICTURE_FIELDS:
+        f = getattr(r, field_name)
+        props[field_name] = media_prefix + filepath_to_uri(f.name) if f else ""
+
+    return props
+
+
+def record_feature(r, media_prefix):
+    """A record as a GeoJSON Feature (polygon in lng/lat)."""
+    ring = coordinates_to_ring(r.polygonCoordinate)
+    geometry = None
+    if ring:
+        geometry = {
+            "type": "Polygon",
+            "coordinates": [ring],
+        }
+    return {
+        "type": "Feature",
+        "geometry": geometry,
+        "properties": record_properties(r, media_prefix),
+    }
+
+
+def _reproject_features(features, reprojector):
+    """Reproject the rings of a batch of features in one go."""
+    rings = [f["geometry"]["coordinates"][0] if f["geometry"] else None for f in features]
+    for feature, ring in zip(features, reprojector.transform_rings(rings)):
+        if ring:
+            feature["geometry"]["coordinates"] = [ring]
+
+
+def geojson_chunks(qs, media_prefix, reprojector=None):
+    """
+    Yield a GeoJSON FeatureCollection piece by piece: the header, then one
+    feature at a time, then the footer.
+    With a reprojector, each chunk of features is reprojected together and
+    the collection is labelled with a (pre-RFC 7946) "crs" member that QGIS reads.
+    """
+    if reprojector is None:
+        yield '{"type": "FeatureCollection", "features": ['
+    else:
+        crs = {"type": "name", "properties": {"name": f"urn:ogc:def:crs:EPSG::{reprojector.srid}"}}
+        yield '{"type": "FeatureCollection", "crs": %s, "features": [' % json.dumps(crs)
+
+    separator = ""
+    batch = []
+    for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        batch.append(record_feature(r, media_prefix))
+        if reprojector is None or len(batch) >= EXPORT_CHUNK_SIZE:
+            if reprojector is not None:
+                _reproject_features(batch, reprojector)
+            for feature in batch:
+                yield separator + json.dumps(feature)
+                separator = ", "
+            batch = []
+
+    if batch:
+        _reproject_features(batch, reprojector)
+        for feature in batch:
+            yield separator + json.dumps(feature)
+            separator = ", "
+    yield "]}"
+
+
+# ----- GeoPackage / FlatGeobuf / Shapefile -----
+
+# Binary GIS formats, written by GDAL's ogr2ogr from the GeoJSON stream.
+# GeoPackage and FlatGeobuf get a spatial index so desktop GIS can open and
+# pan large exports without reading every feature.
+GIS_EXPORT_FORMATS = {
+    "gpkg": {
+        "driver": "GPKG",
+        "filename": "records.gpkg",
+        "content_type": "application/geopackage+sqlite3",
+        "options": ["-lco", "SPATIAL_INDEX=YES"],
+    },
+    "fgb": {
+        "driver": "FlatGeobuf",
+        "filename": "records.fgb",
+        "content_type": "application/flatgeobuf",
+        "options": ["-lco", "SPATIAL_INDEX=YES"],
+    },
+    "shp": {
+        "driver": "ESRI Shapefile",
+        "filename": "records.shp",
+        "content_type": "application/zip",
+        # Shapefile field names are cut to 10 characters (e.g. monument_t)
+        "options": ["-lco", "ENCODING=UTF-8"],
+        "zip": "records.zip",
+    },
+}
+
+
+class ExportError(Exception):
+    """Raised when a GIS export file can't be written (e.g. ogr2ogr is missing)."""
+
+
+def write_gis_export(qs, media_prefix, fmt, directory, srid=None):
+    """
+    Write records to a GIS file in directory and return its path.
+    With srid, GDAL reprojects the file (e.g. 27700 for British National Grid).
+    The records are streamed to a temporary GeoJSON file first, so memory use
+    doesn't depend on the number of records. Shapefiles are zipped up with
+    their .shx/.dbf/.prj/.cpg side files.
+    """
+    spec = GIS_EXPORT_FORMATS[fmt]
+    source = os.path.join(directory, "records.geojson")
+    with open(source, "w", encoding="utf-8") as f:
+        for chunk in geojson_chunks(qs, media_prefix):
+            f.write(chunk)
+
+    target_dir = os.path.join(directory, fmt)
+    os.makedirs(target_dir)
+    target = os.path.join(target_dir, spec["filename"])
+    command = [
+        getattr(settings, "OGR2OGR_BINARY", "ogr2ogr"),
+        "-f", spec["driver"],
+        "-nln", "records",
+        "-nlt", "POLYGON",
+        *spec["options"],
+        *(["-t_srs", f"EPSG:{srid}"] if srid else []),
+        target,
+        source,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except FileNotFoundError:
+        raise ExportError("GDAL's ogr2ogr is not installed on the server.")
+    except subprocess.CalledProcessError as exc:
+        raise ExportError(exc.stderr.decode(errors="replace").strip() or "ogr2ogr failed.")
+
+    if "zip" not in spec:
+        return target
+
+    archive = os.path.join(directory, spec["zip"])
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(os.listdir(target_dir)):
+            zf.write(os.path.join(target_dir, name), arcname=name)
+    return archive
+
+
+def open_gis_export(qs, media_prefix, fmt, srid=None):
+    """
+    Write a GIS export and return it as an open binary file.
+    The temporary files are removed straight away; the open handle keeps
+    the data readable until the response has been sent.
+    """
+    directory = tempfile.mkdtemp(prefix="records-export-")
+    try:
+        path = write_gis_export(qs, media_prefix, fmt, directory, srid)
+        return open(path, "rb")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# ----- Any format to a file -----
+
+EXPORT_FILENAMES = {
+    "csv": "records.csv",
+    "geojson": "records.geojson",
+    **{fmt: spec.get("zip", spec["filename"]) for fmt, spec in GIS_EXPORT_FORMATS.items()},
+}
+
+
+def write_export(qs, media_prefix, fmt, directory):
+    """Write records in any export format to a file in directory and return its path."""
+    if fmt in GIS_EXPORT_FORMATS:
+        return write_gis_export(qs.only(*FEATURE_FIELDS), media_prefix, fmt, directory)
+
+    path = os.path.join(directory, EXPORT_FILENAMES[fmt])
+    if fmt == "csv":
+        chunks = csv_rows(qs.defer(*Record.SIMPLIFIED_GEOMETRY_FIELDS, "search_vector"))
+    else:
+        chunks = geojson_chunks(qs.only(*FEATURE_FIELDS), media_prefix)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path
@@ -0,0 +1,271 @@
+import json
+
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import LineString, Polygon
+
+
+def coordinates_to_ring(coords):
+    """
+    Convert stored polygonCoordinate values (Leaflet [lat, lng] pairs or
+    {lat, lng} dicts) into a closed ring of (lng, lat) tuples.
+    Returns None if there are fewer than three usable points.
+    """
+    # Some legacy rows store the JSON as a string
+    if isinstance(coords, str):
+        try:
+            coords = json.loads(coords)
+        except Exception:
+            return None
+
+    if not coords:
+        return None
+
+    ring = []
+    for pt in coords:
+        lat = lng = None
+
+        # Accept {lat: .., lng: ..}
+        if isinstance(pt, dict):
+            lat = pt.get("lat")
+            lng = pt.get("lng")
+
+        # Accept [lat, lng] or (lat, lng)
+        elif isinstance(pt, (list, tuple)) and len(pt) >= 2:
+            lat, lng = pt[0], pt[1]
+
+        if lat is None or lng is None:
+            continue
+
+        try:
+            ring.append((float(lng), float(lat)))
+        except (TypeError, ValueError):
+            continue
+
+    if len(ring) < 3:
+        return None
+
+    # Close ring if needed
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+
+    return ring
+
+
+def polygon_from_coordinates(coords):
+    """
+    Build a WGS84 (SRID 4326) Polygon from polygonCoordinate, or None if the
+    stored value can't be turned into a ring.
+    """
+    ring = coordinates_to_ring(coords)
+    if ring is None:
+        return None
+    return Polygon(ring, srid=4326)
+
+
+# Simplified copies of Record.geometry used for drawing at lower zoom levels.
+# (model field, simplification tolerance in degrees, highest zoom it's used at)
+# Tolerances are about half a screen pixel at that zoom, so the simplification
+# can't be seen on the map.
+SIMPLIFIED_LEVELS = [
+    ("geometry_z8", 0.0025, 8),
+    ("geometry_z12", 0.00015, 12),
+    ("geometry_z15", 0.00002, 15),
+]
+
+
+def simplify_polygon(geometry, tolerance):
+    """
+    Topology-preserving simplification of a polygon, or None if there is
+    nothing usable left (callers then fall back to the full geometry).
+    """
+    if geometry is None:
+        return None
+    simplified = geometry.simplify(tolerance, preserve_topology=True)
+    if simplified.empty or simplified.geom_type != "Polygon":
+        return None
+    simplified.srid = geometry.srid
+    return simplified
+
+
+def simplified_geometries(geometry):
+    """Return {field name: simplified polygon} for every SIMPLIFIED_LEVELS entry."""
+    return {
+        field: simplify_polygon(geometry, tolerance)
+        for field, tolerance, _max_zoom in SIMPLIFIED_LEVELS
+    }
+
+
+def geometry_field_for_zoom(zoom):
+    """Pick the coarsest geometry column that still looks right at this zoom."""
+    for field, _tolerance, max_zoom in SIMPLIFIED_LEVELS:
+        if zoom <= max_zoom:
+            return field
+    return "geometry"
+
+
+def geometry_field_for_tolerance(tolerance):
+    """Pick the coarsest geometry column simplified no more than tolerance (degrees)."""
+    for field, level_tolerance, _max_zoom in SIMPLIFIED_LEVELS:
+        if level_tolerance <= tolerance:
+            return field
+    return "geometry"
+
+
+def polygon_to_coordinates(geometry):
+    """
+    Convert a polygon back to the polygonCoordinate format: an open list of
+    [lat, lng] pairs (Leaflet order, without the repeated closing point).
+    """
+    ring = geometry.exterior_ring.coords
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring = ring[:-1]
+    return [[lat, lng] for lng, lat in ring]
+
+
+BRITISH_NATIONAL_GRID = 27700
+
+
+def geometry_metrics(geometry):
+    """
+    Size and position of a polygon: area (m²) and perimeter (m) measured in
+    British National Grid, plus centroid, bounding box and vertex count.
+    Empty geometry gives zeros and None. Self-intersecting (bow-tie) rings
+    are measured once made valid; as drawn, their halves cancel out to 0 m².
+    """
+    if geometry is None:
+        return {
+            "area_m2": 0,
+            "perimeter_m": 0,
+            "centroid": None,
+            "bbox": None,
+            "vertex_count": 0,
+        }
+
+    measured = geometry if geometry.valid else geometry.make_valid()
+    bng = measured.transform(BRITISH_NATIONAL_GRID, clone=True)
+    bbox = Polygon.from_bbox(geometry.extent)
+    bbox.srid = geometry.srid
+    return {
+        "area_m2": bng.area,
+        "perimeter_m": bng.length,
+        "centroid": measured.centroid,
+        "bbox": bbox,
+        # The exterior ring repeats its first point to close itself
+        "vertex_count": len(geometry.exterior_ring) - 1,
+    }
+
+
+WGS84 = 4326
+
+# Coordinate systems records can be returned in (?crs=)
+OUTPUT_SRIDS = [WGS84, BRITISH_NATIONAL_GRID]
+
+
+class Reprojector:
+    """
+    Reprojects lng/lat coordinates into another coordinate system.
+    One GDAL CoordTransform is built and reused, and each batch of rings is
+    sent to it as a single line, so a whole chunk of records costs one call.
+    """
+
+    def __init__(self, srid):
+        self.srid = srid
+        self.transform = CoordTransform(SpatialReference(WGS84), SpatialReference(srid))
+
+    def transform_rings(self, rings):
+        """
+        Reproject a list of rings (lists of (lng, lat); None/empty entries
+        are passed through) and return them as lists of (x, y) tuples.
+        """
+        points = [pt for ring in rings if ring for pt in ring]
+        if not points:
+            return rings
+        # A line needs two points; a duplicated lone point is dropped again below
+        line = LineString(points if len(points) > 1 else points * 2, srid=WGS84)
+        line.transform(self.transform)
+        coords = line.coords
+
+        result = []
+        start = 0
+        for ring in rings:
+            if not ring:
+                result.append(ring)
+                continue
+            result.append(list(coords[start:start + len(ring)]))
+            start += len(ring)
+        return result
+
+    def transform_geometry(self, geometry):
+        """Reprojected copy of a single GEOS geometry (None passes through)."""
+        if geometry is None:
+            return None
+        return geometry.transform(self.transform, clone=True)
+
+
+# ----- Compact coordinate encodings (?geometry_encoding=) -----
+
+GEOMETRY_ENCODINGS = ["polyline", "delta"]
+
+
+def quantize_coordinates(coords, precision):
+    """
+    Round polygonCoordinate ([lat, lng] pairs or {lat, lng} dicts) to
+    precision decimal places, returned as [lat, lng] pairs.
+    Points that aren't a usable pair are dropped.
+    """
+    points = []
+    for pt in coords or []:
+        if isinstance(pt, dict):
+            pt = (pt.get("lat"), pt.get("lng"))
+        try:
+            points.append([round(float(pt[0]), precision), round(float(pt[1]), precision)])
+        except (IndexError, TypeError, ValueError):
+            continue
+    return points
+
+
+def _integer_points(coords, precision):
+    factor = 10 ** precision
+    return [(round(lat * factor), round(lng * factor)) for lat, lng in quantize_coordinates(coords, precision)]
+
+
+def delta_encode(coords, precision):
+    """
+    Coordinates as whole numbers of 10^-precision degrees: the first
+    [lat, lng] in full, then each point as the difference from the one before.
+    """
+    deltas = []
+    prev_lat = prev_lng = 0
+    for lat, lng in _integer_points(coords, precision):
+        deltas.append([lat - prev_lat, lng - prev_lng])
+        prev_lat, prev_lng = lat, lng
+    return deltas
+
+
+def _polyline_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chars = []
+    while value >= 0x20:
+        chars.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def encode_polyline(coords, precision):
+    """
+    Coordinates as an encoded polyline string (Google's algorithm, lat
+    before lng) at precision decimal places: 5 is the usual Google format,
+    6 matches polyline6 decoders.
+    """
+    return "".join(
+        _polyline_value(lat) + _polyline_value(lng)
+        for lat, lng in delta_encode(coords, precision)
+    )
+
+
+def encode_coordinates(coords, encoding, precision):
+    """polygonCoordinate in one of GEOMETRY_ENCODINGS."""
+    if encoding == "polyline":
+        return encode_polyline(coords, precision)
+    return delta_encode(coords, precision)
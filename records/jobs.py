@@ -0,0 +1,249 @@
+"""
+Background jobs: record exports and offline region bundles.
+A job is created by the API and built outside the request, either in a
+thread started when the job is saved or by the process_export_jobs
+management command. Finished files are reused by later requests for the
+same export (or area) until the records collection changes.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from records.bundles import BUNDLE_FILENAME, region_key, write_bundle
+from records.exports import EXPORT_FILENAMES, media_url_prefix, write_export
+from records.models import BackgroundJob, CollectionVersion, ExportJob, RegionBundle
+
+logger = logging.getLogger(__name__)
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(minutes=getattr(settings, "EXPORT_JOB_TIMEOUT_MINUTES", 30))
+
+
+def expire_stale_jobs():
+    """
+    Mark jobs that have been running for longer than
+    EXPORT_JOB_TIMEOUT_MINUTES as failed and return how many there were.
+    A job whose worker died part way (restart, out of memory) would
+    otherwise stay "running" for ever and be handed to every later request
+    for the same export.
+    """
+    cutoff = _stale_cutoff()
+    expired = 0
+    for model in (ExportJob, RegionBundle):
+        expired += model.objects.filter(
+            models.Q(started_at__lt=cutoff) | models.Q(started_at__isnull=True, created_at__lt=cutoff),
+            status=BackgroundJob.STATUS_RUNNING,
+        ).update(
+            status=BackgroundJob.STATUS_FAILED,
+            error="The job timed out before it finished.",
+            finished_at=timezone.now(),
+        )
+    return expired
+
+
+def find_reusable_job(scope, fmt, owner):
+    """
+    Return an existing job for this export that is finished and still up to
+    date, or still being built, so a new one isn't needed. Otherwise None.
+    A job that has been waiting too long (its thread never ran) is started again.
+    """
+    expire_stale_jobs()
+    version, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+    jobs = ExportJob.objects.filter(scope=scope, format=fmt, owner=owner)
+    done = jobs.filter(status=ExportJob.STATUS_DONE, collection_version=version).order_by("-id").first()
+    if done is not None:
+        return done
+    job = jobs.filter(
+        status__in=[ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING]
+    ).order_by("-id").first()
+    if job is not None and job.status == ExportJob.STATUS_PENDING and job.created_at < _stale_cutoff():
+        # Safe to start twice: only one worker can claim it
+        start_export_job(job)
+    return job
+
+
+def _claim(job):
+    """Mark a pending job as running; False if another worker got there first."""
+    return type(job).objects.filter(pk=job.pk, status=BackgroundJob.STATUS_PENDING).update(
+        status=BackgroundJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+    ) == 1
+
+
+def _finish(job):
+    """Save the outcome of a job; False if it couldn't be saved."""
+    job.finished_at = timezone.now()
+    try:
+        job.save()
+    except Exception as exc:
+        logger.exception("Could not save %s %s", type(job).__name__, job.pk)
+        type(job).objects.filter(pk=job.pk).update(
+            status=BackgroundJob.STATUS_FAILED,
+            error=str(exc),
+            finished_at=job.finished_at,
+        )
+        return False
+    return True
+
+
+def run_export_job(job):
+    """Build the export file for a job and store it on the job."""
+    # Claim the job so two workers don't build it at the same time
+    if not _claim(job):
+        return
+
+    # Everything after the claim is covered, so a failure can't leave the job "running"
+    directory = tempfile.mkdtemp(prefix="records-export-")
+    try:
+        job.refresh_from_db()
+        # Taken before reading so a change during the export marks the file as stale
+        job.collection_version, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+        path = write_export(job.records(), media_url_prefix(), job.format, directory)
+        with open(path, "rb") as f:
+            job.file.save(EXPORT_FILENAMES[job.format], File(f), save=False)
+        job.status = ExportJob.STATUS_DONE
+    except Exception as exc:
+        logger.exception("Export job %s failed", job.pk)
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(exc)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if _finish(job) and job.status == ExportJob.STATUS_DONE:
+        _delete_superseded(job)
+
+
+def _delete_superseded(job):
+    """Remove files of older finished jobs for the same export."""
+    older = ExportJob.objects.filter(
+        scope=job.scope,
+        format=job.format,
+        owner=job.owner,
+        status=ExportJob.STATUS_DONE,
+        pk__lt=job.pk,
+    )
+    for old in older:
+        if old.file:
+            old.file.delete(save=False)
+    older.delete()
+
+
+def request_bundle(bbox, min_zoom, max_zoom, user):
+    """
+    Return the bundle for a (rounded) region at the current collection
+    version, creating it and starting its build if nobody has asked yet.
+    The unique (region, version) constraint means concurrent requests for
+    the same area share one row and one build. A failed bundle is retried.
+    """
+    expire_stale_jobs()
+    version, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+    minx, miny, maxx, maxy = bbox
+    bundle, created = RegionBundle.objects.get_or_create(
+        region_key=region_key(bbox, min_zoom, max_zoom),
+        collection_version=version,
+        defaults={
+            "minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy,
+            "min_zoom": min_zoom, "max_zoom": max_zoom,
+            "requested_by": user,
+        },
+    )
+    start = created
+    if not created:
+        RegionBundle.objects.filter(pk=bundle.pk).update(last_requested_at=timezone.now())
+        if bundle.status == RegionBundle.STATUS_FAILED:
+            start = RegionBundle.objects.filter(pk=bundle.pk, status=RegionBundle.STATUS_FAILED).update(
+                status=RegionBundle.STATUS_PENDING, error="", started_at=None, finished_at=None,
+            ) == 1
+            bundle.refresh_from_db()
+        elif bundle.status == RegionBundle.STATUS_PENDING and bundle.created_at < _stale_cutoff():
+            start = True
+    if start:
+        start_bundle_job(bundle)
+    return bundle
+
+
+def run_bundle_job(bundle):
+    """Build the MBTiles file for a bundle and store it on the bundle."""
+    if not _claim(bundle):
+        return
+
+    directory = tempfile.mkdtemp(prefix="records-bundle-")
+    try:
+        bundle.refresh_from_db()
+        path = os.path.join(directory, BUNDLE_FILENAME)
+        write_bundle(path, bundle.bbox, bundle.min_zoom, bundle.max_zoom, bundle.collection_version)
+        # The stored name may get a suffix; the bundle is only ever read through bundle.file
+        with open(path, "rb") as f:
+            bundle.file.save(f"{bundle.region_key}-v{bundle.collection_version}.mbtiles", File(f), save=False)
+        bundle.status = RegionBundle.STATUS_DONE
+    except Exception as exc:
+        logger.exception("Region bundle %s failed", bundle.pk)
+        bundle.status = RegionBundle.STATUS_FAILED
+        bundle.error = str(exc)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if _finish(bundle) and bundle.status == RegionBundle.STATUS_DONE:
+        _delete_bundles(RegionBundle.objects.filter(
+            region_key=bundle.region_key,
+            collection_version__lt=bundle.collection_version,
+        ))
+        delete_unused_bundles()
+
+
+def _delete_bundles(bundles):
+    """Delete finished (or failed) bundles and their files; running ones are left alone."""
+    bundles = bundles.filter(status__in=[RegionBundle.STATUS_DONE, RegionBundle.STATUS_FAILED])
+    for old in bundles:
+        if old.file:
+            old.file.delete(save=False)
+    return bundles.delete()[0]
+
+
+def delete_unused_bundles():
+    """
+    Remove bundles nobody has asked for in RECORDS_BUNDLE_RETENTION_DAYS,
+    so arbitrary areas don't stay in storage for ever. Returns how many.
+    """
+    days = getattr(settings, "RECORDS_BUNDLE_RETENTION_DAYS", 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    return _delete_bundles(RegionBundle.objects.filter(last_requested_at__lt=cutoff))
+
+
+def _run_in_thread(model, job_id, run):
+    close_old_connections()
+    try:
+        run(model.objects.get(pk=job_id))
+    finally:
+        close_old_connections()
+
+
+def _start(job, run):
+    if not getattr(settings, "EXPORT_JOBS_USE_THREADS", True):
+        return
+    model = type(job)
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_thread, args=(model, job.pk, run), daemon=True).start()
+    )
+
+
+def start_export_job(job):
+    """
+    Start building a job once the current transaction commits.
+    With EXPORT_JOBS_USE_THREADS off, jobs wait for process_export_jobs.
+    """
+    _start(job, run_export_job)
+
+
+def start_bundle_job(bundle):
+    """Start building a region bundle, as start_export_job does for exports."""
+    _start(bundle, run_bundle_job)
@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from records.api.serializers import RecordSerializer
+from records.models import Record
+
+User = get_user_model()
+
+
+def make_records(count, vertices):
+    """Build unsaved records in memory so only serialisation is timed."""
+    user = User(id=1, username="benchmark")
+    records = []
+    for i in range(count):
+        lat, lng = 51.5 + (i % 100) * 0.01, -3.9 + (i // 100) * 0.01
+        coords = [
+            [lat + 0.001 * (j % 2), lng + 0.001 * (j // 2 % 2) + 0.0001 * j]
+            for j in range(vertices)
+        ]
+        record = Record(
+            id=i + 1,
+            recorded_by=user,
+            title=f"Record {i}",
+            description="Earthwork visible on the LiDAR hillshade. " * 5,
+            PRN=f"PRN{i:05d}",
+            site_type="enclosure",
+            monument_type="hillfort",
+            period="iron_age",
+            polygonCoordinate=coords,
+        )
+        record.update_geometry()
+        records.append(record)
+    return records
+
+
+class Command(BaseCommand):
+    help = "Compare RecordSerializer's generic DRF list path with the fast RecordListSerializer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=10000)
+        parser.add_argument("--vertices", type=int, default=12)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        records = make_records(options["records"], options["vertices"])
+
+        def generic():
+            # Plain ListSerializer: every field goes through DRF's to_representation
+            return serializers.ListSerializer(child=RecordSerializer(), instance=records).data
+
+        def fast():
+            return RecordSerializer(records, many=True).data
+
+        renderer = JSONRenderer()
+        if renderer.render(generic()) != renderer.render(fast()):
+            self.stderr.write(self.style.ERROR("Outputs differ!"))
+            return
+
+        results = {}
+        for name, fn in (("generic", generic), ("fast", fast)):
+            best = None
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best
+            self.stdout.write(
+                f"{name:>8}: {best:.3f}s ({len(records) / best:,.0f} records/s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Output identical; fast path is {results['generic'] / results['fast']:.1f}x faster."
+        ))
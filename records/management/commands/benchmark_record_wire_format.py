@@ -0,0 +1,56 @@
+import gzip
+import json
+import time
+
+import msgpack
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from records.api.renderers import MessagePackRenderer
+from records.api.serializers import RecordSerializer
+from records.management.commands.benchmark_record_serializer import make_records
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Compare the size and encode/decode time of record lists as JSON and MessagePack."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=10000)
+        parser.add_argument("--vertices", type=int, default=12)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        records = make_records(options["records"], options["vertices"])
+        data = RecordSerializer(records, many=True).data
+        repeat = options["repeat"]
+
+        formats = {
+            "json": (JSONRenderer(), json.loads),
+            "msgpack": (MessagePackRenderer(), lambda body: msgpack.unpackb(body, raw=False)),
+        }
+
+        decoded = {}
+        for name, (renderer, decode) in formats.items():
+            body = renderer.render(data)
+            decoded[name] = decode(body)
+            encode_time = best_time(lambda: renderer.render(data), repeat)
+            decode_time = best_time(lambda: decode(body), repeat)
+            self.stdout.write(
+                f"{name:>8}: {len(body):>12,} bytes ({len(gzip.compress(body)):,} gzipped), "
+                f"encode {encode_time:.3f}s, decode {decode_time:.3f}s"
+            )
+
+        if decoded["json"] != decoded["msgpack"]:
+            self.stderr.write(self.style.ERROR("Decoded outputs differ!"))
+            return
+        self.stdout.write(self.style.SUCCESS("Decoded outputs identical."))
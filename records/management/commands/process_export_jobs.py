@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from records.jobs import delete_unused_bundles, expire_stale_jobs, run_bundle_job, run_export_job
+from records.models import ExportJob, RegionBundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Build any export jobs and offline region bundles that are still waiting "
+        "(pending). Jobs left running for longer than EXPORT_JOB_TIMEOUT_MINUTES "
+        "are marked as failed first, and bundles unused for "
+        "RECORDS_BUNDLE_RETENTION_DAYS are deleted."
+    )
+
+    def handle(self, *args, **options):
+        expired = expire_stale_jobs()
+        if expired:
+            self.stdout.write(f"Marked {expired} stale jobs as failed.")
+        jobs = ExportJob.objects.filter(status=ExportJob.STATUS_PENDING).order_by("id")
+        count = 0
+        for job in jobs:
+            run_export_job(job)
+            job.refresh_from_db()
+            count += 1
+            self.stdout.write(f"Export job {job.pk}: {job.status}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} export jobs."))
+
+        bundles = RegionBundle.objects.filter(status=RegionBundle.STATUS_PENDING).order_by("id")
+        count = 0
+        for bundle in bundles:
+            run_bundle_job(bundle)
+            bundle.refresh_from_db()
+            count += 1
+            self.stdout.write(f"Region bundle {bundle.pk}: {bundle.status}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} region bundles."))
+
+        deleted = delete_unused_bundles()
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} unused region bundles.")
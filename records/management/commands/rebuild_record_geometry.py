@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from records.models import CollectionVersion, Record
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the geometry columns derived from polygonCoordinate "
+        "(PostGIS geometry, simplified copies and measurements) for every record, "
+        "then mark them all as changed so caches and synced clients pick it up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of records to load and update per batch.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        fields = Record.DERIVED_GEOMETRY_FIELDS
+        batch = []
+        total = 0
+
+        qs = Record.objects.only("id", "polygonCoordinate").order_by("id")
+        for record in qs.iterator(chunk_size=chunk_size):
+            record.update_geometry()
+            batch.append(record)
+            if len(batch) >= chunk_size:
+                Record.objects.bulk_update(batch, fields)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            Record.objects.bulk_update(batch, fields)
+            total += len(batch)
+
+        if total:
+            # bulk_update skips Record.save(), so bump the collection once for the whole run
+            with transaction.atomic():
+                version = CollectionVersion.bump(CollectionVersion.RECORDS)
+                Record.objects.update(change_version=version, updated_at=timezone.now())
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt geometry for {total} records."))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 09:12
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+from records.geometry import polygon_from_coordinates
+
+
+def backfill_geometry(apps, schema_editor):
+    Record = apps.get_model("records", "Record")
+    for record in Record.objects.only("id", "polygonCoordinate").iterator(chunk_size=500):
+        geometry = polygon_from_coordinates(record.polygonCoordinate)
+        if geometry is not None:
+            Record.objects.filter(pk=record.pk).update(geometry=geometry)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0018_alter_record_polygoncoordinate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='geometry',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, srid=4326),
+        ),
+        migrations.RunPython(backfill_geometry, migrations.RunPython.noop),
+    ]
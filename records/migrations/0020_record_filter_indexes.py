@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0019_record_geometry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['period', 'site_type'], name='record_period_site_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['site_type', 'monument_type'], name='record_site_monument_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['date_recorded', 'period'], name='record_date_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['recorded_by', 'date_recorded'], name='record_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('monument_type__in', ['', 'unknown']), _negated=True), fields=['monument_type'], name='record_monument_known_idx'),
+        ),
+    ]
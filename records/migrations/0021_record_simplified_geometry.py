@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 11:20
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0020_record_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='geometry_z8',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='geometry_z12',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='geometry_z15',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 12:02
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+from records.geometry import geometry_metrics
+
+
+def backfill_metrics(apps, schema_editor):
+    Record = apps.get_model("records", "Record")
+    qs = Record.objects.filter(geometry__isnull=False).only("id", "geometry")
+    for record in qs.iterator(chunk_size=500):
+        Record.objects.filter(pk=record.pk).update(**geometry_metrics(record.geometry))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0021_record_simplified_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='area_m2',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='perimeter_m',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='vertex_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='centroid',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='bbox',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunPython(backfill_metrics, migrations.RunPython.noop),
+    ]
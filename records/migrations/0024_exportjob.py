@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0023_collectionversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('mine', 'My records'), ('all', 'All records (staff only)')], default='mine', max_length=10)),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('geojson', 'GeoJSON'), ('gpkg', 'GeoPackage'), ('fgb', 'FlatGeobuf'), ('shp', 'Shapefile (zip)')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('collection_version', models.BigIntegerField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/%Y/%m/%d/')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'format', 'owner', 'status'], name='exportjob_lookup_idx')],
+            },
+        ),
+    ]
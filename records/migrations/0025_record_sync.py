@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 17:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def version_existing_records(apps, schema_editor):
+    """
+    Give records that existed before change tracking a real change version,
+    so clients syncing from an earlier token still receive them.
+    """
+    Record = apps.get_model("records", "Record")
+    CollectionVersion = apps.get_model("records", "CollectionVersion")
+    if not Record.objects.exists():
+        return
+    counter, _ = CollectionVersion.objects.get_or_create(name="records")
+    counter.version += 1
+    counter.modified = django.utils.timezone.now()
+    counter.save(update_fields=["version", "modified"])
+    Record.objects.update(change_version=counter.version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0024_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='change_version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(version_existing_records, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RecordTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_id', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('change_version', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 18:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from records.search import search_vector
+
+
+def fill_search_vector(apps, schema_editor):
+    Record = apps.get_model("records", "Record")
+    Record.objects.update(search_vector=search_vector(Record))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0025_record_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='record_search_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 19:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0026_record_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('PRN'), name='gin_trgm_ops'), name='record_prn_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='record_title_trgm_idx'),
+        ),
+    ]
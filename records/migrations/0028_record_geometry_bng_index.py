@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 19:50
+
+import django.contrib.gis.db.models.functions
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0027_record_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GistIndex(django.contrib.gis.db.models.functions.Transform('geometry', 27700), name='record_geometry_bng_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0028_record_geometry_bng_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 22:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0029_exportjob_started_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('region_key', models.CharField(max_length=16)),
+                ('minx', models.FloatField()),
+                ('miny', models.FloatField()),
+                ('maxx', models.FloatField()),
+                ('maxy', models.FloatField()),
+                ('min_zoom', models.PositiveSmallIntegerField()),
+                ('max_zoom', models.PositiveSmallIntegerField()),
+                ('collection_version', models.BigIntegerField()),
+                ('file', models.FileField(blank=True, null=True, upload_to='bundles/')),
+                ('last_requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('region_key', 'collection_version'), name='regionbundle_region_version_uniq')],
+            },
+        ),
+    ]
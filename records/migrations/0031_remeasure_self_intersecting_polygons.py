@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 09:20
+
+import django.utils.timezone
+from django.db import migrations
+
+from records.geometry import geometry_metrics
+
+
+def remeasure_self_intersecting_polygons(apps, schema_editor):
+    """
+    Bow-tie polygons were stored with the area of the ring as drawn (about
+    0 m²), so the duplicate check never matched them. Measure them again
+    (made valid) and mark them as changed for synced clients.
+    """
+    Record = apps.get_model("records", "Record")
+    CollectionVersion = apps.get_model("records", "CollectionVersion")
+    qs = Record.objects.filter(geometry__isvalid=False).only("id", "geometry")
+    ids = []
+    for record in qs.iterator(chunk_size=500):
+        Record.objects.filter(pk=record.pk).update(**geometry_metrics(record.geometry))
+        ids.append(record.pk)
+    if not ids:
+        return
+    counter, _ = CollectionVersion.objects.get_or_create(name="records")
+    counter.version += 1
+    counter.modified = django.utils.timezone.now()
+    counter.save(update_fields=["version", "modified"])
+    Record.objects.filter(pk__in=ids).update(change_version=counter.version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0030_regionbundle'),
+    ]
+
+    operations = [
+        migrations.RunPython(remeasure_self_intersecting_polygons, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,21 @@
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
-from django.db import models
+from django.contrib.gis.db import models  # GeoDjango models (includes all of django.db.models)
 from django.db.models import JSONField  # Import JSONField for storing polygon coordinates
-# Import Point so we can create locations
-# using longitude and latitude coordinates
+from django.db.models.functions import Upper
 from django.contrib.auth import get_user_model
+from django.contrib.gis.db.models.functions import Transform
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+
+from records.geometry import (
+    BRITISH_NATIONAL_GRID,
+    geometry_metrics,
+    polygon_from_coordinates,
+    simplified_geometries,
+)
+from records.search import SEARCH_SOURCE_FIELDS, search_vector
 
 User = get_user_model()
 
@@ -144,6 +155,33 @@ class Record(models.Model):
     # Store polygon as a JSON **list** of [lat, lng] pairs
     polygonCoordinate = models.JSONField(default=list, null=False, blank=False)
 
+    # PostGIS copy of polygonCoordinate (lng/lat, WGS84) so the database can
+    # answer spatial queries. Kept in sync in save(); spatial_index gives it a GiST index.
+    geometry = models.PolygonField(srid=4326, null=True, blank=True, spatial_index=True)
+
+    # Simplified copies of geometry for drawing at low zoom (see records.geometry.SIMPLIFIED_LEVELS).
+    # Never queried spatially, so no index; spatial filters use geometry.
+    geometry_z8 = models.PolygonField(srid=4326, null=True, blank=True, spatial_index=False)
+    geometry_z12 = models.PolygonField(srid=4326, null=True, blank=True, spatial_index=False)
+    geometry_z15 = models.PolygonField(srid=4326, null=True, blank=True, spatial_index=False)
+
+    # Measurements of geometry, recomputed on save (area/perimeter in British National Grid)
+    area_m2 = models.FloatField(default=0, db_index=True)
+    perimeter_m = models.FloatField(default=0, db_index=True)
+    vertex_count = models.PositiveIntegerField(default=0)
+    centroid = models.PointField(srid=4326, null=True, blank=True, spatial_index=True)
+    bbox = models.PolygonField(srid=4326, null=True, blank=True, spatial_index=False)
+
+    # ----- Sync -----
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Records collection version of the last change to this record (see
+    # CollectionVersion); the changes feed returns records above a client's version
+    change_version = models.BigIntegerField(default=0, db_index=True)
+
+    # Full-text search document (see records.search), refreshed in save()
+    search_vector = SearchVectorField(null=True, editable=False)
+
     # ----- Images -----
     picture1 = models.ImageField(
         blank=True, null=True, upload_to="pictures/%Y/%m/%d/",
@@ -166,5 +204,236 @@ class Record(models.Model):
         validators=[validate_file_size]
     )
 
+    class Meta:
+        # Match the filters on the records API (records/api/filters.py).
+        # recorded_by already has an index from the ForeignKey.
+        indexes = [
+            models.Index(fields=["period", "site_type"], name="record_period_site_idx"),
+            models.Index(fields=["site_type", "monument_type"], name="record_site_monument_idx"),
+            models.Index(fields=["date_recorded", "period"], name="record_date_period_idx"),
+            models.Index(fields=["recorded_by", "date_recorded"], name="record_user_date_idx"),
+            # Most records have a blank/unknown monument type; leave those out so the index stays small
+            models.Index(
+                fields=["monument_type"],
+                name="record_monument_known_idx",
+                condition=~models.Q(monument_type__in=["", "unknown"]),
+            ),
+            GinIndex(fields=["search_vector"], name="record_search_idx"),
+            # Trigram indexes for the typeahead (case-insensitive LIKE on PRN and title)
+            GinIndex(OpClass(Upper("PRN"), name="gin_trgm_ops"), name="record_prn_trgm_idx"),
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="record_title_trgm_idx"),
+            # Geometry in metres, for distance queries (see records.spatial.AOI_SQL)
+            GistIndex(Transform("geometry", BRITISH_NATIONAL_GRID), name="record_geometry_bng_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title}"
+
+    # Columns that are worked out from polygonCoordinate in update_geometry()
+    SIMPLIFIED_GEOMETRY_FIELDS = ["geometry_z8", "geometry_z12", "geometry_z15"]
+    GEOMETRY_METRIC_FIELDS = ["area_m2", "perimeter_m", "vertex_count", "centroid", "bbox"]
+    DERIVED_GEOMETRY_FIELDS = ["geometry"] + SIMPLIFIED_GEOMETRY_FIELDS + GEOMETRY_METRIC_FIELDS
+
+    def update_geometry(self):
+        """
+        Rebuild the PostGIS geometry, its simplified copies and its
+        measurements from polygonCoordinate.
+        """
+        self.geometry = polygon_from_coordinates(self.polygonCoordinate)
+        for field, simplified in simplified_geometries(self.geometry).items():
+            setattr(self, field, simplified)
+        for field, value in geometry_metrics(self.geometry).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        # Keep the geometry columns in sync with the JSON coordinates on every save
+        self.update_geometry()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields) | {"change_version", "updated_at"}
+            if "polygonCoordinate" in update_fields:
+                update_fields |= set(self.DERIVED_GEOMETRY_FIELDS)
+            kwargs["update_fields"] = update_fields
+        with transaction.atomic():
+            # bump() locks the version counter until this transaction commits,
+            # so change versions are handed out in commit order and a client
+            # syncing from version N can't miss a change numbered below it
+            self.change_version = CollectionVersion.bump(CollectionVersion.RECORDS)
+            super().save(*args, **kwargs)
+            if update_fields is None or update_fields & set(SEARCH_SOURCE_FIELDS):
+                # Built in the database from the saved columns (labels included)
+                type(self).objects.filter(pk=self.pk).update(search_vector=search_vector(type(self)))
+
+
+class CollectionVersion(models.Model):
+    """
+    A counter that goes up every time a collection (e.g. all records) changes.
+    Used to answer conditional GETs (ETag / Last-Modified) without
+    re-reading the collection itself.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    RECORDS = "records"
+
+    @classmethod
+    def bump(cls, name):
+        """
+        Mark the collection as changed and return its new version.
+        The counter row stays locked until the caller's transaction ends.
+        """
+        with transaction.atomic():
+            obj, _ = cls.objects.select_for_update().get_or_create(name=name)
+            obj.version += 1
+            obj.modified = timezone.now()
+            obj.save(update_fields=["version", "modified"])
+        return obj.version
+
+    @classmethod
+    def current(cls, name):
+        """Return the (version, modified) pair for the collection."""
+        obj, _ = cls.objects.get_or_create(name=name)
+        return obj.version, obj.modified
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class RecordTombstone(models.Model):
+    """
+    Left behind when a record is deleted, so clients syncing with the
+    changes feed find out it has gone.
+    """
+    record_id = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    # Records collection version of the deletion (see Record.change_version)
+    change_version = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Record {self.record_id} deleted"
+
+
+class BackgroundJob(models.Model):
+    """
+    Status and timings shared by files that are built in the background
+    (see records.jobs).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker claimed the job (see records.jobs.expire_stale_jobs)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+
+class ExportJob(BackgroundJob):
+    """
+    An export of records that is built in the background.
+    Finished files are kept and handed to anyone who asks for the same
+    export (scope, format and owner) until the records change.
+    """
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('geojson', 'GeoJSON'),
+        ('gpkg', 'GeoPackage'),
+        ('fgb', 'FlatGeobuf'),
+        ('shp', 'Shapefile (zip)'),
+    ]
+
+    SCOPE_MINE = 'mine'
+    SCOPE_ALL = 'all'
+    SCOPE_CHOICES = [
+        (SCOPE_MINE, "My records"),
+        (SCOPE_ALL, "All records (staff only)"),
+    ]
+
+    requested_by = models.ForeignKey(
+        User,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="export_jobs"
+    )
+    # Whose records are exported: the user for "mine", empty for "all"
+    owner = models.ForeignKey(
+        User,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default=SCOPE_MINE)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    # Records collection version the file was built from (see CollectionVersion)
+    collection_version = models.BigIntegerField(null=True, blank=True)
+    file = models.FileField(upload_to="exports/%Y/%m/%d/", blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["scope", "format", "owner", "status"], name="exportjob_lookup_idx"),
+        ]
+
+    def records(self):
+        """The records this job exports."""
+        qs = Record.objects.all()
+        if self.scope == self.SCOPE_MINE:
+            qs = qs.filter(recorded_by=self.owner)
+        return qs.order_by("-id")
+
+    def __str__(self):
+        return f"{self.get_scope_display()} as {self.format} ({self.status})"
+
+
+class RegionBundle(BackgroundJob):
+    """
+    An offline bundle (see records.bundles) for one area and zoom range,
+    built in the background for a records collection version.
+    Bundles nobody has asked for in RECORDS_BUNDLE_RETENTION_DAYS are removed.
+    """
+    # Hash of the rounded bbox and zoom range (see records.bundles.region_key)
+    region_key = models.CharField(max_length=16)
+    minx = models.FloatField()
+    miny = models.FloatField()
+    maxx = models.FloatField()
+    maxy = models.FloatField()
+    min_zoom = models.PositiveSmallIntegerField()
+    max_zoom = models.PositiveSmallIntegerField()
+    collection_version = models.BigIntegerField()
+    file = models.FileField(upload_to="bundles/", blank=True, null=True)
+    requested_by = models.ForeignKey(
+        User,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+"
+    )
+    last_requested_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # One build per area and version, however many people ask at once
+            models.UniqueConstraint(
+                fields=["region_key", "collection_version"],
+                name="regionbundle_region_version_uniq",
+            ),
+        ]
+
+    @property
+    def bbox(self):
+        return (self.minx, self.miny, self.maxx, self.maxy)
+
+    def __str__(self):
+        return f"Bundle {self.region_key} v{self.collection_version} ({self.status})"
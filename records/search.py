@@ -0,0 +1,55 @@
+"""
+Full-text search over records.
+Each record keeps a stored tsvector (Record.search_vector) built from its
+text fields, refreshed on save and indexed with GIN, so ?q= searches don't
+have to read the rows themselves.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = "english"
+
+# Fields that feed the search vector; saving any of them refreshes it
+SEARCH_SOURCE_FIELDS = ["title", "description", "PRN", "site_type", "monument_type", "period"]
+
+
+def _display_label(model, field_name):
+    """SQL version of get_<field>_display(): the choice label, or the stored value."""
+    field = model._meta.get_field(field_name)
+    return Case(
+        *[When(**{field_name: value}, then=Value(str(label))) for value, label in field.flatchoices],
+        default=F(field_name),
+    )
+
+
+def search_vector(model):
+    """
+    Expression that builds a record's search vector from its own columns.
+    Title and PRN weigh most, then the type and period labels, then the description.
+    """
+    return (
+        SearchVector("title", "PRN", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(
+            _display_label(model, "site_type"),
+            _display_label(model, "monument_type"),
+            _display_label(model, "period"),
+            weight="B",
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def search_query(text):
+    """Parse ?q= the way web search boxes do (quoted phrases, -word, or)."""
+    return SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+
+
+def search_rank(text):
+    """
+    Relevance of a record to ?q=. ts_rank gives a 4 byte real; it is cast to
+    double so the value read back (e.g. into a pagination cursor) compares
+    equal to the one in the database.
+    """
+    return Cast(SearchRank(F("search_vector"), search_query(text)), FloatField())
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import CollectionVersion, Record, RecordTombstone
+
+
+@receiver(post_delete, sender=Record)
+def record_deleted(sender, instance, **kwargs):
+    """
+    Signal to bump the records collection version when a record is deleted
+    and leave a tombstone for the changes feed.
+    Saves bump the version in Record.save() itself.
+    """
+    version = CollectionVersion.bump(CollectionVersion.RECORDS)
+    RecordTombstone.objects.create(record_id=instance.pk, change_version=version)
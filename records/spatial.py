@@ -0,0 +1,133 @@
+"""
+Spatial queries over records that need more than a bbox filter.
+"""
+import math
+
+from django.contrib.gis.db.models.functions import (
+    Distance,
+    GeometryDistance,
+    Intersection,
+    MakeValid,
+    Union,
+)
+from django.db.models import FloatField, Func
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import NullIf
+
+from records.geometry import BRITISH_NATIONAL_GRID
+from records.models import Record
+
+# Sphere radius PostGIS uses for ST_DistanceSphere
+EARTH_RADIUS_M = 6370986
+METRES_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+
+
+def _degrees_covering(point, metres):
+    """
+    A distance in degrees that reaches at least `metres` from point in
+    every direction (a degree of longitude shrinks away from the equator).
+    """
+    lat = min(abs(point.y) + metres / METRES_PER_DEGREE, 89.9)
+    return metres / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+
+
+def nearest_records(point, k, queryset=None):
+    """
+    The k records whose centroids are nearest to point (WGS84), closest
+    first, annotated with `distance` (a Distance; .m for metres).
+
+    The KNN operator (<->) walks the GiST index on Record.centroid, but it
+    measures in degrees, where east-west distances count for too much.
+    So the k records it finds only set a radius; everything within that
+    radius is then re-ranked by true distance in metres, which still comes
+    from the index (ST_DWithin) and touches a handful of rows.
+    """
+    qs = (queryset if queryset is not None else Record.objects.all()).filter(centroid__isnull=False)
+    distance = Distance("centroid", point)
+
+    first = list(
+        qs.annotate(distance=distance)
+        .order_by(GeometryDistance("centroid", point))
+        .values_list("distance", flat=True)[:k]
+    )
+    if not first:
+        return qs.none()
+
+    radius = _degrees_covering(point, max(first).m)
+    return (
+        qs.filter(centroid__dwithin=(point, radius))
+        .annotate(distance=distance)
+        .order_by("distance", "id")[:k]
+    )
+
+
+# Largest number of vertices in each piece an area of interest is cut into
+AOI_MAX_VERTICES = 256
+
+# Records within a distance (metres) of an area of interest. The area is cut
+# into small pieces with ST_Subdivide, so each ST_DWithin test is against a
+# few hundred vertices with a tight bounding box, rather than one predicate
+# against the whole shape. Each piece finds its records through the GiST
+# index on ST_Transform(geometry, 27700) (record_geometry_bng_idx), so the
+# expression here must stay the same as the index's.
+AOI_SQL = """
+SELECT r.id
+FROM {table} r
+JOIN (SELECT ST_Subdivide(ST_GeomFromEWKB(%s), %s) AS geom) piece
+    ON ST_DWithin(ST_Transform(r.geometry, {srid}), piece.geom, %s)
+"""
+
+
+def records_near_area(area, distance_m, queryset=None):
+    """
+    Records whose geometry is within distance_m metres of area (a GEOS
+    polygon or line with an srid), measured in British National Grid.
+    """
+    area = area.transform(BRITISH_NATIONAL_GRID, clone=True)
+    sql = AOI_SQL.format(table=Record._meta.db_table, srid=BRITISH_NATIONAL_GRID)
+    qs = queryset if queryset is not None else Record.objects.all()
+    return qs.filter(id__in=RawSQL(sql, (memoryview(area.ewkb), AOI_MAX_VERTICES, distance_m)))
+
+
+class _PlanarArea(Func):
+    """ST_Area in the geometry's own units (only ever used for ratios)."""
+    function = "ST_Area"
+    output_field = FloatField()
+
+
+def duplicate_candidates(geometry, threshold, limit=5):
+    """
+    Existing records whose polygon overlaps geometry (WGS84) with an
+    intersection over union of at least threshold, best match first,
+    annotated with `iou`.
+
+    Hand-drawn polygons are often self-intersecting (bow-ties), which GEOS
+    can't intersect, so both the new polygon and the stored ones are made
+    valid first. An IoU of t needs the two areas to be within a factor of t
+    of each other, and the bounding boxes to overlap, so the indexed
+    area_m2 column and the GiST index on geometry (&&) narrow things down
+    to a few rows before any intersection is worked out.
+    """
+    if not geometry.valid:
+        geometry = geometry.make_valid()
+    # Measured the same way as the stored area_m2 (see geometry_metrics)
+    area_m2 = geometry.transform(BRITISH_NATIONAL_GRID, clone=True).area
+    if area_m2 <= 0:
+        return Record.objects.none()
+
+    stored = MakeValid("geometry")
+    iou = _PlanarArea(Intersection(stored, geometry)) / NullIf(
+        _PlanarArea(Union(stored, geometry)), 0.0
+    )
+    return (
+        Record.objects
+        .filter(
+            area_m2__gte=area_m2 * threshold,
+            area_m2__lte=area_m2 / threshold,
+            geometry__bboverlaps=geometry,
+        )
+        .annotate(iou=iou)
+        .filter(iou__gte=threshold)
+        .order_by("-iou")
+        .only("id", "title", "PRN")[:limit]
+    )
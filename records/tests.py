@@ -1,3 +1,623 @@
-from django.test import TestCase
+import csv
+import json
+from ast import literal_eval
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from records.api.serializers import RecordListSerializer, RecordSerializer
+from records.api.views import record_queryset_for_fields
+from records.exports import csv_rows
+from records.geometry import BRITISH_NATIONAL_GRID, Reprojector
+from records.jobs import find_reusable_job, run_bundle_job, run_export_job
+from records.models import CollectionVersion, ExportJob, Record, RegionBundle
+from records.tiles import TILE_LAYER, tile_for
+
+User = get_user_model()
+
+
+def make_record(**kwargs):
+    """A saved record with a small square polygon near Llandeilo."""
+    lat, lng = kwargs.pop("lat", 51.88), kwargs.pop("lng", -3.99)
+    defaults = {
+        "title": "Enclosure",
+        "description": "Earthwork visible on the LiDAR hillshade.",
+        "site_type": "enclosure",
+        "period": "iron_age",
+        "polygonCoordinate": [
+            [lat, lng], [lat + 0.001, lng], [lat + 0.001, lng + 0.001], [lat, lng + 0.001],
+        ],
+    }
+    defaults.update(kwargs)
+    return Record.objects.create(**defaults)
+
+
+class RecordChangesTests(TestCase):
+    """The changes feed (/api/records/changes/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("record-changes")
+
+    def get(self, since=None):
+        params = {} if since is None else {"since": since}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync_all(self, since=None):
+        """Follow "more" to the end; returns (changed ids in order, deleted ids, final token)."""
+        changed, deleted = [], []
+        while True:
+            page = self.get(since)
+            changed += [r["id"] for r in page["changed"]]
+            deleted += page["deleted"]
+            since = page["token"]
+            if not page["more"]:
+                return changed, deleted, since
+
+    def test_full_sync_includes_records_from_before_change_tracking(self):
+        # bulk_create skips save(), like rows that existed before the migration
+        Record.objects.bulk_create([
+            Record(title=f"Old {i}", description="", site_type="enclosure", period="roman",
+                   polygonCoordinate=[])
+            for i in range(3)
+        ])
+        self.assertEqual(set(Record.objects.values_list("change_version", flat=True)), {0})
+
+        changed, deleted, _token = self.sync_all()
+        self.assertCountEqual(changed, Record.objects.values_list("id", flat=True))
+        self.assertEqual(deleted, [])
+
+    @override_settings(RECORDS_MAX_PAGE_SIZE=2)
+    def test_paging_through_records_sharing_a_version(self):
+        version = CollectionVersion.bump(CollectionVersion.RECORDS)
+        Record.objects.bulk_create([
+            Record(title=f"Old {i}", description="", site_type="enclosure", period="roman",
+                   polygonCoordinate=[], change_version=version)
+            for i in range(5)
+        ])
+        make_record(title="New")
+
+        changed, _deleted, _token = self.sync_all()
+        self.assertEqual(len(changed), 6)
+        self.assertCountEqual(changed, Record.objects.values_list("id", flat=True))
+
+        # A page cut part way through a version carries the last id
+        first = self.get()
+        self.assertTrue(first["more"])
+        self.assertEqual(first["token"], f"{version}:{first['changed'][-1]['id']}")
+
+    def test_only_later_changes_and_deletions_after_a_token(self):
+        kept = make_record(title="Kept")
+        edited = make_record(title="Edited")
+        removed = make_record(title="Removed")
+        _changed, _deleted, token = self.sync_all()
+
+        edited.title = "Edited again"
+        edited.save()
+        removed_id = removed.pk
+        removed.delete()
+
+        changed, deleted, new_token = self.sync_all(token)
+        self.assertEqual(changed, [edited.pk])
+        self.assertEqual(deleted, [removed_id])
+        self.assertNotIn(kept.pk, changed)
+
+        # Nothing new since the last token
+        self.assertEqual(self.sync_all(new_token)[:2], ([], []))
+
+    def test_invalid_token(self):
+        for token in ["abc", "-1", "3:x", "3:-2"]:
+            response = self.client.get(self.url, {"since": token})
+            self.assertEqual(response.status_code, 400, token)
+
+
+@override_settings(EXPORT_JOBS_USE_THREADS=False, EXPORT_JOB_TIMEOUT_MINUTES=30)
+class ExportJobRecoveryTests(TestCase):
+    """Export jobs whose worker died, or that failed part way, don't block later exports."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("surveyor", password="x")
+
+    def make_job(self, **kwargs):
+        return ExportJob.objects.create(requested_by=self.user, owner=self.user, format="csv", **kwargs)
+
+    def test_running_job_is_reused_until_it_goes_stale(self):
+        job = self.make_job(status=ExportJob.STATUS_RUNNING, started_at=timezone.now())
+        self.assertEqual(find_reusable_job(ExportJob.SCOPE_MINE, "csv", self.user), job)
+
+        ExportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(find_reusable_job(ExportJob.SCOPE_MINE, "csv", self.user))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+
+    def test_failure_after_claim_marks_job_failed(self):
+        job = self.make_job()
+        with mock.patch("records.jobs.write_export", side_effect=RuntimeError("disk full")):
+            run_export_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        self.assertEqual(job.error, "disk full")
+        self.assertIsNotNone(job.finished_at)
+
+
+@override_settings(RECORDS_DUPLICATE_IOU_THRESHOLD=0.5)
+class RecordDuplicateTests(TestCase):
+    """Duplicate detection in RecordCreate."""
+
+    square = [[51.88, -3.99], [51.881, -3.99], [51.881, -3.989], [51.88, -3.989]]
+    # Self-intersecting ring, as Leaflet lets people draw
+    bow_tie = [[51.88, -3.99], [51.881, -3.989], [51.881, -3.99], [51.88, -3.989]]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("surveyor", password="x"))
+        self.url = reverse("record-create")
+
+    def post(self, coords, **extra):
+        data = {
+            "title": "Enclosure",
+            "description": "Traced from the hillshade.",
+            "site_type": "enclosure",
+            "period": "iron_age",
+            "polygonCoordinate": coords,
+            **extra,
+        }
+        return self.client.post(self.url, data, format="json")
+
+    def test_close_overlap_is_rejected_unless_confirmed(self):
+        existing = make_record(polygonCoordinate=self.square)
+
+        response = self.post(self.square)
+        self.assertEqual(response.status_code, 409)
+        duplicate, = response.json()["duplicates"]
+        # Values keep their JSON types (ids are numbers, a missing PRN is null)
+        self.assertEqual(duplicate["id"], existing.pk)
+        self.assertIsNone(duplicate["PRN"])
+        self.assertIsInstance(duplicate["iou"], float)
+        self.assertEqual(Record.objects.count(), 1)
+
+        response = self.post(self.square, confirm_duplicate=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([d["id"] for d in response.json()["possible_duplicates"]], [existing.pk])
+
+    def test_separate_polygon_is_saved(self):
+        make_record(polygonCoordinate=self.square)
+        far = [[lat + 0.01, lng] for lat, lng in self.square]
+        self.assertEqual(self.post(far).status_code, 201)
+
+    def test_self_intersecting_polygons_are_matched(self):
+        existing = make_record(polygonCoordinate=self.bow_tie)
+        # Measured made valid (two triangles), not as the 0 m² ring drawn
+        self.assertGreater(existing.area_m2, 0)
+
+        response = self.post(self.bow_tie)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([d["id"] for d in response.json()["duplicates"]], [existing.pk])
+
+        # A valid polygon against a stored bow-tie is checked without errors
+        self.assertIn(self.post(self.square, confirm_duplicate=True).status_code, (201, 409))
+
+
+# Keeps test files out of the S3 bucket
+IN_MEMORY_STORAGES = {
+    **settings.STORAGES,
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+}
+
+
+@override_settings(EXPORT_JOBS_USE_THREADS=False, RECORDS_BUNDLE_MAX_TILES=20, STORAGES=IN_MEMORY_STORAGES)
+class RecordBundleTests(TestCase):
+    """Offline region bundles (/api/records/bundle/)."""
+
+    params = {"bbox": "-4.0,51.87,-3.98,51.89", "min_zoom": 10, "max_zoom": 12}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("surveyor", password="x"))
+        self.url = reverse("record-bundle")
+
+    def test_requires_login(self):
+        self.assertIn(APIClient().get(self.url, self.params).status_code, (401, 403))
+
+    def test_bundle_is_built_once_in_the_background(self):
+        make_record()
+        with mock.patch("records.jobs.write_bundle") as write:
+            first = self.client.get(self.url, self.params)
+            second = self.client.get(self.url, self.params)
+            write.assert_not_called()
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual(RegionBundle.objects.count(), 1)
+
+        bundle = RegionBundle.objects.get()
+        run_bundle_job(bundle)
+        bundle.refresh_from_db()
+        self.assertEqual(bundle.status, RegionBundle.STATUS_DONE)
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        b"".join(response.streaming_content)
+
+        # A revalidation is answered without touching the bundle
+        with mock.patch("records.api.map_views.request_bundle") as request_bundle:
+            response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+            request_bundle.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+
+    def test_too_many_tiles(self):
+        response = self.client.get(self.url, {**self.params, "max_zoom": 18})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RegionBundle.objects.exists())
+
+
+class RebuildRecordGeometryTests(TestCase):
+    """The rebuild_record_geometry command marks records as changed."""
+
+    def test_rebuild_bumps_versions(self):
+        record = make_record()
+        before, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+
+        call_command("rebuild_record_geometry", stdout=StringIO())
+
+        after, _ = CollectionVersion.current(CollectionVersion.RECORDS)
+        record.refresh_from_db()
+        self.assertEqual(after, before + 1)
+        self.assertEqual(record.change_version, after)
+        self.assertGreater(record.area_m2, 0)
+
+
+class RecordListOrderingTests(TestCase):
+    """Cursor pages stay complete when sorting by a column with repeated values."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def pages(self, params):
+        ids = []
+        response = self.client.get(reverse("record-list"), params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ids += [r["id"] for r in page["results"]]
+            if not page["next"]:
+                return ids
+            response = self.client.get(page["next"])
+
+    def test_paging_by_a_shared_sort_value(self):
+        # Same shape, so every record has the same area and vertex count
+        records = [make_record(lat=51.88 + i * 0.01) for i in range(5)]
+        records.append(make_record(lat=51.95, polygonCoordinate=[
+            [51.95, -3.99], [51.952, -3.99], [51.952, -3.988], [51.95, -3.988],
+        ]))
+
+        for ordering in ["vertex_count", "-area_m2", "date_recorded"]:
+            ids = self.pages({"ordering": ordering, "page_size": 2})
+            self.assertEqual(len(ids), len(records), ordering)
+            self.assertCountEqual(ids, [r.pk for r in records], ordering)
+
+        ids = self.pages({"ordering": "-area_m2", "page_size": 4})
+        self.assertEqual(ids[0], records[-1].pk)
+
+    def test_search_results_page_best_match_first(self):
+        title_match = make_record(title="Hillfort", description="")
+        # Same text, so the same rank: ties come newest first
+        description_matches = [
+            make_record(title="Enclosure", description="Possible hillfort rampart") for _ in range(3)
+        ]
+        make_record(title="Barrow", description="Round barrow")
+
+        ids = self.pages({"q": "hillfort", "page_size": 1})
+        self.assertEqual(ids, [title_match.pk] + [r.pk for r in reversed(description_matches)])
+
+
+class CsvExportTests(TestCase):
+    """CSV export in British National Grid (?crs=27700)."""
+
+    def rows(self, reprojector=None):
+        lines = list(csv_rows(Record.objects.order_by("id"), reprojector))
+        return list(csv.DictReader(lines))
+
+    def test_coordinates_are_reprojected(self):
+        make_record()
+        make_record(polygonCoordinate='[[51.9, -3.9], [51.91, -3.9], [51.91, -3.89]]')
+        rows = self.rows(Reprojector(BRITISH_NATIONAL_GRID))
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            # Eastings around Llandeilo are roughly 260000-270000
+            self.assertRegex(row["geometry"], r"^POLYGON \(\(2\d{5}")
+            self.assertRegex(row["centroid"], r"^POINT \(2\d{5}")
+            easting, northing = literal_eval(row["polygonCoordinate"])[0]
+            self.assertGreater(easting, 200000)
+            self.assertGreater(northing, 200000)
+        self.assertEqual(len(literal_eval(rows[0]["polygonCoordinate"])), 4)
+
+        plain = self.rows()
+        self.assertTrue(plain[0]["geometry"].startswith("POLYGON ((-3.99"))
+
+    def test_unusable_polygon_coordinates_are_left_empty(self):
+        record = make_record()
+        Record.objects.filter(pk=record.pk).update(polygonCoordinate=[[51.9, -3.9]])
+        row, = self.rows(Reprojector(BRITISH_NATIONAL_GRID))
+        self.assertEqual(row["polygonCoordinate"], "")
+
+
+class RecordAreaSearchTests(TestCase):
+    """Area of interest search (/api/records/area/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("record-area-search")
+        self.area = {
+            "type": "Polygon",
+            "coordinates": [[[-4.0, 51.87], [-3.9, 51.87], [-3.9, 51.95], [-4.0, 51.95], [-4.0, 51.87]]],
+        }
+
+    def test_results_are_paged_not_truncated(self):
+        inside = [make_record(lat=51.88 + i * 0.01) for i in range(5)]
+        make_record(lat=52.5)
+
+        ids, after, pages = [], None, 0
+        while True:
+            body = {"geometry": self.area, "buffer": 0}
+            if after is not None:
+                body["after"] = after
+            response = self.client.post(f"{self.url}?page_size=2", body, format="json")
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data["count"], 5)
+            ids += [r["id"] for r in data["results"]]
+            pages += 1
+            if not data["more"]:
+                self.assertIsNone(data["after"])
+                break
+            after = data["after"]
+
+        self.assertEqual(ids, [r.pk for r in inside])
+        self.assertEqual(pages, 3)
+
+    def test_invalid_after(self):
+        response = self.client.post(self.url, {"geometry": self.area, "after": "x"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class RecordListSerializerParityTests(TestCase):
+    """The fast list path gives exactly what DRF's own ListSerializer gives."""
+
+    def setUp(self):
+        user = User.objects.create_user("surveyor", password="x")
+        make_record(title="Mine", recorded_by=user, PRN="PRN1")
+        make_record(title="Nobody's", recorded_by=None, lat=51.9)
+        legacy = make_record(title="Legacy", recorded_by=user, lat=51.92)
+        # Some old rows hold polygonCoordinate as a JSON string
+        Record.objects.filter(pk=legacy.pk).update(
+            polygonCoordinate="[[51.92, -3.99], [51.921, -3.99], [51.921, -3.989]]"
+        )
+
+    def assertSameOutput(self, fields=None, context=None):
+        context = context or {}
+        records = list(record_queryset_for_fields(fields).order_by("id"))
+        generic = serializers.ListSerializer(
+            child=RecordSerializer(fields=fields, context=context), instance=records
+        ).data
+        fast = RecordSerializer(records, many=True, fields=fields, context=context)
+        self.assertIsInstance(fast, RecordListSerializer)
+        self.assertEqual(JSONRenderer().render(fast.data), JSONRenderer().render(generic))
+        return fast.data
+
+    def test_all_fields(self):
+        data = self.assertSameOutput()
+        # recorded_by.username is skipped (not null) when there is no user, as in DRF
+        self.assertNotIn("recorded_by", data[1])
+        self.assertIsInstance(data[2]["polygonCoordinate"], list)
+
+    def test_sparse_fields(self):
+        for fields in [
+            ["id", "title", "recorded_by", "recorded_by_user_id"],
+            RecordSerializer.FIELD_PROFILES["map"],
+            ["id", "polygonCoordinate", "centroid", "bbox", "date_recorded", "period_display"],
+        ]:
+            with self.subTest(fields=fields):
+                self.assertSameOutput(fields)
+
+    def test_simplified_and_encoded_geometry(self):
+        self.assertSameOutput(context={"geometry_field": "geometry_z8"})
+        self.assertSameOutput(context={"geometry_encoding": ("polyline", 5)})
+
+
+class RecordTileTests(TestCase):
+    """Vector tiles (/api/records/tiles/z/x/y.mvt)."""
+
+    def get_tile(self, z, x, y, **headers):
+        return APIClient().get(reverse("record-tile", args=[z, x, y]), **headers)
+
+    def test_tile_clients_media_types_are_accepted(self):
+        for accept in ["application/vnd.mapbox-vector-tile", "application/x-protobuf", "*/*"]:
+            response = self.get_tile(0, 0, 0, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200, accept)
+            self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+
+    def test_tile_holds_the_records_inside_it(self):
+        make_record()
+        x, y = tile_for(-3.99, 51.88, 12)
+        response = self.get_tile(12, x, y)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(TILE_LAYER.encode(), response.content)
+        self.assertIn(b"iron_age", response.content)
+
+        # Nothing recorded out at sea
+        x, y = tile_for(-6.5, 51.5, 12)
+        self.assertEqual(self.get_tile(12, x, y).content, b"")
+
+        # Revalidating an unchanged collection doesn't build the tile
+        with mock.patch("records.api.map_views.build_tile") as build:
+            again = self.get_tile(12, x, y, HTTP_IF_NONE_MATCH=response["ETag"])
+            build.assert_not_called()
+        self.assertEqual(again.status_code, 304)
+
+    def test_out_of_range(self):
+        self.assertEqual(self.get_tile(3, 8, 0).status_code, 404)
+
+
+class OgcApiTests(TestCase):
+    """OGC API - Features endpoints (/api/ogc/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_landing_page_links_to_the_api_definition(self):
+        links = {link["rel"]: link["href"] for link in self.client.get(reverse("ogc-landing")).json()["links"]}
+        self.assertIn("service-desc", links)
+        response = self.client.get(links["service-desc"])
+        self.assertEqual(response.status_code, 200)
+        definition = json.loads(response.content)  # application/vnd.oai.openapi+json
+        self.assertEqual(definition["openapi"], "3.0.3")
+        self.assertIn("/collections/records/items", definition["paths"])
+
+    def items(self, url=None, **params):
+        response = self.client.get(url or reverse("ogc-items"), params, HTTP_ACCEPT="application/geo+json")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_items_paging_follows_next_and_prev_links(self):
+        ids = [make_record(lat=51.88 + i * 0.01).pk for i in range(3)]
+        page = self.items(limit=2)
+        self.assertEqual((page["numberMatched"], page["numberReturned"]), (3, 2))
+        self.assertEqual([f["id"] for f in page["features"]], ids[:2])
+
+        links = {link["rel"]: link["href"] for link in page["links"]}
+        self.assertNotIn("prev", links)
+        page = self.items(links["next"])
+        self.assertEqual([f["id"] for f in page["features"]], ids[2:])
+        links = {link["rel"]: link["href"] for link in page["links"]}
+        self.assertNotIn("next", links)
+        self.assertEqual([f["id"] for f in self.items(links["prev"])["features"]], ids[:2])
+
+    def test_items_bbox_and_datetime(self):
+        old = make_record(date_recorded=date(2020, 5, 1))
+        new = make_record(date_recorded=date(2024, 5, 1))
+        far = make_record(lat=53.2, lng=-4.1, date_recorded=date(2024, 5, 1))
+
+        def ids(page):
+            return sorted(f["id"] for f in page["features"])
+
+        self.assertEqual(ids(self.items(bbox="-4.0,51.87,-3.98,51.89")), sorted([old.pk, new.pk]))
+        # 3D bboxes are accepted, heights ignored
+        self.assertEqual(ids(self.items(bbox="-4.0,51.87,0,-3.98,51.89,100")), sorted([old.pk, new.pk]))
+        self.assertEqual(ids(self.items(datetime="2024-01-01/..")), sorted([new.pk, far.pk]))
+        self.assertEqual(ids(self.items(datetime="../2021-01-01")), [old.pk])
+        self.assertEqual(ids(self.items(datetime="2024-05-01T00:00:00Z")), sorted([new.pk, far.pk]))
+        self.assertEqual(ids(self.items(bbox="-4.0,51.87,-3.98,51.89", datetime="2024-05-01")), [new.pk])
+
+        response = self.client.get(reverse("ogc-items"), {"bbox": "1,2,3"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecordListOutputTests(TestCase):
+    """Output options on the record list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        make_record()
+
+    def test_geometry_encoding_with_default_crs(self):
+        url = reverse("record-list")
+        for crs in ["4326", "EPSG:4326"]:
+            response = self.client.get(url, {"geometry_encoding": "polyline", "crs": crs})
+            self.assertEqual(response.status_code, 200, crs)
+            self.assertIsInstance(response.json()["results"][0]["polygonCoordinate"], str)
+        response = self.client.get(url, {"geometry_encoding": "polyline", "crs": "27700"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_output_options_are_rejected_before_querying(self):
+        record = Record.objects.get()
+        for url in [reverse("record-changes"), reverse("record-nearby", args=[record.pk])]:
+            for params in [{"crs": "3857"}, {"geometry_encoding": "wkt"}, {"fields": "nope"}]:
+                with self.subTest(url=url, params=params), self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class RecordClusterTests(TestCase):
+    """Cluster counts (/api/records/clusters/)."""
+
+    def test_records_are_counted_by_cell(self):
+        make_record(period="roman")
+        make_record(lat=51.881)
+        make_record(lat=53.2, lng=-4.1)
+        response = APIClient().get(reverse("record-clusters"), {"zoom": 6})
+        self.assertEqual(response.status_code, 200)
+        clusters = sorted(response.json()["clusters"], key=lambda c: c["count"])
+        self.assertEqual([c["count"] for c in clusters], [1, 2])
+        self.assertEqual(clusters[1]["period"], {"roman": 1, "iron_age": 1})
+
+
+class RecordSuggestTests(TestCase):
+    """Typeahead (/api/records/suggest/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("record-suggest")
+        self.hillfort = make_record(title="Hillfort at Garn Goch", PRN="12345")
+        self.barrow = make_record(title="Round barrow", PRN="98765")
+        self.enclosure = make_record(title="Enclosure near the hillfort", PRN="12399")
+
+    def suggest(self, prefix, **params):
+        response = self.client.get(self.url, {"prefix": prefix, **params})
+        self.assertEqual(response.status_code, 200)
+        return [s["id"] for s in response.json()]
+
+    def test_matches_on_prn_and_title(self):
+        self.assertCountEqual(self.suggest("123"), [self.hillfort.pk, self.enclosure.pk])
+        self.assertEqual(self.suggest("1234"), [self.hillfort.pk])
+        # Two characters only match the start of a title (case-insensitive)
+        self.assertEqual(self.suggest("hi"), [self.hillfort.pk])
+        # From three characters a title can match anywhere
+        self.assertCountEqual(self.suggest("hillfort"), [self.hillfort.pk, self.enclosure.pk])
+        self.assertEqual(self.suggest("barrow"), [self.barrow.pk])
+        self.assertEqual(len(self.suggest("hillfort", limit=1)), 1)
+
+    def test_prefix_too_short(self):
+        self.assertEqual(self.client.get(self.url, {"prefix": "h"}).status_code, 400)
+
+
+class RecordNearbyTests(TestCase):
+    """Nearest records (/api/records/nearby/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        # Centroids are offset by half a square (0.0005°) from lat/lng
+        self.origin = make_record()
+        # 0.010° east is about 690m at this latitude, 0.008° north about 890m:
+        # in degrees the order is the other way round
+        self.east = make_record(lng=-3.98)
+        self.north = make_record(lat=51.888)
+
+    def nearby(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_nearest_in_metres_not_degrees(self):
+        url = reverse("record-nearby-point")
+        results = self.nearby(url, near="-3.9895,51.8805", k=3)
+        self.assertEqual([r["id"] for r in results], [self.origin.pk, self.east.pk, self.north.pk])
+
+        # k=1 past the origin: the KNN step alone would pick north
+        results = self.nearby(reverse("record-nearby", args=[self.origin.pk]), k=1)
+        self.assertEqual([r["id"] for r in results], [self.east.pk])
+        self.assertAlmostEqual(results[0]["distance_m"], 687, delta=15)
+
+        results = self.nearby(reverse("record-nearby", args=[self.origin.pk]), k=2)
+        self.assertEqual([r["id"] for r in results], [self.east.pk, self.north.pk])
+        self.assertAlmostEqual(results[1]["distance_m"], 890, delta=15)
@@ -0,0 +1,83 @@
+"""
+Mapbox Vector Tiles for records, built in PostGIS.
+"""
+import math
+
+from django.db import connection
+
+from records.geometry import geometry_field_for_zoom
+from records.models import Record
+
+MAX_TILE_ZOOM = 22
+TILE_EXTENT = 4096  # MVT default: tile coordinates run 0..4096
+TILE_BUFFER = 64    # clip polygons a little outside the tile so outlines join up
+TILE_LAYER = "records"
+
+# Vector tile built entirely in PostGIS. The && test on the 4326 tile bounds
+# uses the GiST index on Record.geometry, so each tile only touches the
+# records that fall inside it. {geom_column} is the simplified copy for the
+# tile's zoom level (falling back to the full geometry).
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s) AS geom
+),
+mvtgeom AS (
+    SELECT
+        ST_AsMVTGeom(
+            ST_Transform(COALESCE(r.{geom_column}, r.geometry), 3857),
+            bounds.geom, %(extent)s, %(buffer)s, true
+        ) AS geom,
+        r.id,
+        r.site_type,
+        r.period
+    FROM {table} r, bounds
+    WHERE r.geometry && ST_Transform(bounds.geom, 4326)
+)
+SELECT ST_AsMVT(mvtgeom.*, %(layer)s, %(extent)s, 'geom') FROM mvtgeom
+"""
+
+
+def build_tile(z, x, y):
+    """Return the vector tile z/x/y as bytes (empty if there are no records in it)."""
+    params = {
+        "z": z,
+        "x": x,
+        "y": y,
+        "margin": TILE_BUFFER / TILE_EXTENT,
+        "extent": TILE_EXTENT,
+        "buffer": TILE_BUFFER,
+        "layer": TILE_LAYER,
+    }
+    sql = TILE_SQL.format(table=Record._meta.db_table, geom_column=geometry_field_for_zoom(z))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def tile_for(lng, lat, z):
+    """The x/y of the web mercator tile containing lng/lat at zoom z."""
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox, z):
+    """Yield (x, y) for every tile at zoom z that covers bbox (minx, miny, maxx, maxy)."""
+    minx, miny, maxx, maxy = bbox
+    x0, y0 = tile_for(minx, maxy, z)  # top left
+    x1, y1 = tile_for(maxx, miny, z)  # bottom right
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+def count_tiles(bbox, min_zoom, max_zoom):
+    total = 0
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = tile_for(bbox[0], bbox[3], z)
+        x1, y1 = tile_for(bbox[2], bbox[1], z)
+        total += (x1 - x0 + 1) * (y1 - y0 + 1)
+    return total
@@ -17,6 +17,8 @@ from dotenv import load_dotenv
 
 GDAL_LIBRARY_PATH = os.getenv('GDAL_LIBRARY_PATH')
 GEOS_LIBRARY_PATH = os.getenv('GEOS_LIBRARY_PATH')
+# GDAL's ogr2ogr tool, used for the GeoPackage / FlatGeobuf / Shapefile exports
+OGR2OGR_BINARY = os.getenv('OGR2OGR_BINARY', 'ogr2ogr')
 
 # BASE_DIR is the root directory of your Django project.
 # It is the top-level folder that contains your manage.py file and all apps.
@@ -59,10 +61,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
     'django.contrib.sites',
     'django_extensions',
     'rest_framework',
     'rest_framework_gis',
+    'django_filters',   # Query string filtering for API list views
     'corsheaders',      # Enables Cross-Origin Resource Sharing (CORS) so the frontend (e.g. React) can talk to the backend (Django) from a different origin (like localhost:3000)
     'djoser',        # Django REST framework authentication library
     'rest_framework.authtoken',  # Token authentication for REST framework
@@ -261,6 +265,40 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Records API page size (cursor pagination, see records/api/pagination.py).
+# Clients can ask for a different size with ?page_size= up to the max.
+RECORDS_PAGE_SIZE = int(os.getenv("RECORDS_PAGE_SIZE", "100"))
+RECORDS_MAX_PAGE_SIZE = int(os.getenv("RECORDS_MAX_PAGE_SIZE", "1000"))
+
+# Default decimal places for ?geometry_encoding= output (6 is about 10cm)
+RECORDS_COORDINATE_PRECISION = int(os.getenv("RECORDS_COORDINATE_PRECISION", "6"))
+# Round polygonCoordinate to this many decimal places when records are saved
+# through the API (unset keeps whatever the client sends)
+RECORDS_INGEST_COORDINATE_PRECISION = (
+    int(os.environ["RECORDS_INGEST_COORDINATE_PRECISION"])
+    if os.getenv("RECORDS_INGEST_COORDINATE_PRECISION") else None
+)
+
+# New records overlapping an existing one by at least this intersection over
+# union are treated as possible duplicates (0 turns the check off)
+RECORDS_DUPLICATE_IOU_THRESHOLD = float(os.getenv("RECORDS_DUPLICATE_IOU_THRESHOLD", "0.5"))
+
+# Build background export jobs in a thread straight after they are requested.
+# Turn off to leave them for the process_export_jobs management command (e.g. run from cron).
+EXPORT_JOBS_USE_THREADS = os.getenv("EXPORT_JOBS_USE_THREADS", "True") == "True"
+# Jobs still running after this many minutes are given up on as failed (e.g. the
+# worker building them was restarted) so they can be requested again; jobs
+# waiting this long for their thread are started again
+EXPORT_JOB_TIMEOUT_MINUTES = int(os.getenv("EXPORT_JOB_TIMEOUT_MINUTES", "30"))
+
+# How long (seconds) browsers and CDNs may cache record vector tiles
+RECORDS_TILE_MAX_AGE = int(os.getenv("RECORDS_TILE_MAX_AGE", "300"))
+
+# Most vector tiles an offline region bundle may contain (area x zoom range)
+RECORDS_BUNDLE_MAX_TILES = int(os.getenv("RECORDS_BUNDLE_MAX_TILES", "5000"))
+# Offline bundles nobody has downloaded for this many days are deleted
+RECORDS_BUNDLE_RETENTION_DAYS = int(os.getenv("RECORDS_BUNDLE_RETENTION_DAYS", "7"))
+
 # Email Settings
 # Email settings (reads values from your .env file)
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
@@ -35,7 +35,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         """
         Returns a list of records associated with the user.
         """
-        query = Record.objects.filter(recorded_by=obj.user)
+        query = Record.objects.filter(recorded_by=obj.user).select_related("recorded_by")
         records_serialized = RecordSerializer(query, many=True)
         return records_serialized.data
     
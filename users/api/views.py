@@ -1,4 +1,5 @@
 from users.models import Profile
+from records.api.renderers import RECORD_PARSER_CLASSES, RECORD_RENDERER_CLASSES
 from .serializers import ProfileSerializer
 from rest_framework import generics
 from rest_framework.generics import RetrieveAPIView
@@ -10,6 +11,7 @@ class ProfileDetail(generics.RetrieveAPIView):
     """
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
+    renderer_classes = RECORD_RENDERER_CLASSES
 
 
 class ProfileList(generics.ListAPIView):
@@ -18,6 +20,7 @@ class ProfileList(generics.ListAPIView):
     """
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
+    renderer_classes = RECORD_RENDERER_CLASSES
 
 
 class ProfileUpdate(generics.UpdateAPIView):
@@ -26,10 +29,13 @@ class ProfileUpdate(generics.UpdateAPIView):
     """
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
+    renderer_classes = RECORD_RENDERER_CLASSES
+    parser_classes = RECORD_PARSER_CLASSES
 
 
 class ProfileByUsername(RetrieveAPIView):
     serializer_class = ProfileSerializer
+    renderer_classes = RECORD_RENDERER_CLASSES
 
     def get_object(self):
         username = self.kwargs.get("username")